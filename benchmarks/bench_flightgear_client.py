@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+TelnetClient and UDPClient throughput and latency against the bundled fake FlightGear, headless.
+
+    python benchmarks/bench_flightgear_client.py [-n READS] [--latency MS] [--jitter MS] [--udp-rate HZ]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from uavsim.flightgear import FG_TELEMETRY_PATHS
+from uavsim.flightgear.client import TelnetClient, UDPClient
+from uavsim.flightgear.fake import FakeFlightGear
+
+TELNET_PORT = 15401
+UDP_PORT = 15500
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def bench_telnet(fake, reads):
+    client = TelnetClient('127.0.0.1', TELNET_PORT)
+    await client.read_fg_data_batch(FG_TELEMETRY_PATHS)
+    latencies = []
+    started = time.perf_counter()
+
+    for _ in range(reads):
+        t = time.perf_counter()
+        await client.read_fg_data_batch(FG_TELEMETRY_PATHS)
+        latencies.append(time.perf_counter() - t)
+
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    print('telnet: {} reads, {:.0f} reads/s, latency p50 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms'.format(
+        reads, reads / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+        max(latencies) * 1000
+    ))
+
+
+async def bench_udp(fake, rate, duration):
+    client = UDPClient('127.0.0.1', UDP_PORT)
+    await client.connect()
+    received = []
+    await client.listen(received.append)
+
+    streamer = asyncio.ensure_future(fake.stream_udp('127.0.0.1', UDP_PORT, rate))
+    await asyncio.sleep(duration)
+    streamer.cancel()
+    client.close()
+
+    print('udp: {} records in {:.1f} s, {:.0f} records/s at {:.0f} Hz sent'.format(
+        len(received), duration, len(received) / duration, rate
+    ))
+
+
+async def main(args):
+    fake = FakeFlightGear(latency=args.latency / 1000, jitter=args.jitter / 1000)
+    await fake.start_telnet('127.0.0.1', TELNET_PORT)
+    updater = asyncio.ensure_future(fake.run())
+
+    await bench_telnet(fake, args.reads)
+    await bench_udp(fake, args.udp_rate, args.duration)
+
+    fake.stop()
+    updater.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', dest='reads', type=int, default=2000)
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0, help='Fake response latency, ms')
+    parser.add_argument('--jitter', dest='jitter', type=float, default=0.0, help='Fake response jitter, ms')
+    parser.add_argument('--udp-rate', dest='udp_rate', type=float, default=200.0)
+    parser.add_argument('--duration', dest='duration', type=float, default=2.0, help='UDP run time, s')
+
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Parse cost per telemetry sample: regex-per-line dict building vs. the compiled PropertyParser.
+
+    python benchmarks/bench_property_parser.py [-n SAMPLES]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import FG_LS_TELEMETRY  # noqa: E402
+from uavsim.flightgear.parser import FG_PROP_REGEXP, PropertyParser  # noqa: E402
+from uavsim.telemetry import TelemetryRecord  # noqa: E402
+
+
+def parse_regex(responses):
+    telemetry = {'dt': 0.0}
+
+    for received_data in responses:
+        for row in received_data.decode('ascii').split('\r\n')[:-1]:
+            match = FG_PROP_REGEXP.match(row)
+
+            if not match:
+                continue
+
+            key, value, t = match.groups()
+
+            if not value:
+                continue
+
+            if t == 'double':
+                value = float(value)
+            elif t == 'bool':
+                value = value == 'true'
+
+            telemetry[key] = value
+
+    return telemetry
+
+
+def parse_compiled(parser, responses):
+    values = parser.parse(responses)
+    values[0] = 0.0
+
+    return TelemetryRecord(parser.schema, values)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Property parser benchmark')
+    arg_parser.add_argument('-n', dest='samples', type=int, default=100000, help='Samples per run')
+    arg_parser.add_argument('-r', dest='repeat', type=int, default=5, help='Runs, the best one is reported')
+    args = arg_parser.parse_args()
+
+    parser = PropertyParser()
+    assert parse_compiled(parser, FG_LS_TELEMETRY).to_dict() == parse_regex(FG_LS_TELEMETRY)
+
+    candidates = (
+        ('regex + dict', lambda: parse_regex(FG_LS_TELEMETRY)),
+        ('compiled record', lambda: parse_compiled(parser, FG_LS_TELEMETRY)),
+    )
+
+    for name, fn in candidates:
+        best = min(timeit.repeat(fn, number=args.samples, repeat=args.repeat))
+        per_sample = best / args.samples
+
+        print('{:<16} {:8.2f} us/sample {:10.0f} samples/s'.format(name, per_sample * 1e6, 1 / per_sample))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import pytest
+
+from fixtures import FG_LS_TELEMETRY
+from uavsim.flightgear.parser import PropertyParser
+from uavsim.telemetry import TelemetryRecord
+
+
+@pytest.fixture
+def telemetry():
+    """
+    A combined telemetry record as published by sim_adapter, parsed from recorded `ls` output.
+    """
+    parser = PropertyParser()
+    values = parser.parse(FG_LS_TELEMETRY)
+    values[0] = 1539856800.0
+
+    return TelemetryRecord(parser.schema, values)
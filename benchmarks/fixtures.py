@@ -0,0 +1,43 @@
+"""
+Responses of the FlightGear telnet property server, as recorded from fgfs 2018.3 (SU-37 at EVRA).
+"""
+
+FG_LS_POSITION = (
+    b"latitude-deg =\t'56.92361111'\t(double)\r\n"
+    b"longitude-deg =\t'23.97111111'\t(double)\r\n"
+    b"altitude-ft =\t'2104.718352'\t(double)\r\n"
+    b"altitude-agl-ft =\t'2067.42181'\t(double)\r\n"
+    b"altitude-agl-m =\t'630.1502'\t(double)\r\n"
+    b"ground-elev-ft =\t'37.29654'\t(double)\r\n"
+    b"ground-elev-m =\t'11.36798'\t(double)\r\n"
+    b"sea-level-radius-ft =\t'20884125.35'\t(double)\r\n"
+    b"latitude-string =\t'56*55.417N'\t(string)\r\n"
+    b"longitude-string =\t'23*58.267E'\t(string)\r\n"
+    b"/> "
+)
+FG_LS_ORIENTATION_MODEL = (
+    b"roll-deg =\t'-2.141578402'\t(double)\r\n"
+    b"pitch-deg =\t'4.912760324'\t(double)\r\n"
+    b"heading-deg =\t'267.7012551'\t(double)\r\n"
+    b"alpha-deg =\t'3.110029'\t(double)\r\n"
+    b"beta-deg =\t'-0.01264'\t(double)\r\n"
+    b"yaw-deg =\t''\t(none)\r\n"
+    b"/> "
+)
+FG_LS_VELOCITIES = (
+    b"airspeed-kt =\t'301.5427761'\t(double)\r\n"
+    b"groundspeed-kt =\t'298.0871273'\t(double)\r\n"
+    b"vertical-speed-fps =\t'12.50327391'\t(double)\r\n"
+    b"mach =\t'0.4627158'\t(double)\r\n"
+    b"speed-north-fps =\t'-20.37581'\t(double)\r\n"
+    b"speed-east-fps =\t'-502.4817'\t(double)\r\n"
+    b"speed-down-fps =\t'-12.50327'\t(double)\r\n"
+    b"uBody-fps =\t'503.9271'\t(double)\r\n"
+    b"vBody-fps =\t'-0.11101'\t(double)\r\n"
+    b"wBody-fps =\t'27.38541'\t(double)\r\n"
+    b"equivalent-kt =\t'293.0914'\t(double)\r\n"
+    b"glideslope =\t'0.0248212'\t(double)\r\n"
+    b"on-ground =\t'false'\t(bool)\r\n"
+    b"/> "
+)
+FG_LS_TELEMETRY = (FG_LS_POSITION, FG_LS_ORIENTATION_MODEL, FG_LS_VELOCITIES)
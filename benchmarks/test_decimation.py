@@ -0,0 +1,68 @@
+import h5py
+import numpy as np
+import pytest
+
+from uavsim.decimation import decimate, read_lod
+from uavsim.recording import RECORDING_LOD_FACTOR, RECORDING_LOD_LEVELS, TelemetryPyramid
+
+PLOT_LIMIT = 10000
+
+
+def view_ds(samples):
+    # bucket size HDF5Plot picks for a view of all samples
+    return samples // PLOT_LIMIT + 1
+
+
+@pytest.mark.benchmark(group='decimation')
+def test_decimate_1e6(benchmark):
+    """
+    HDF5Plot.update_hdf5_plot over a fully zoomed out view of 1e6 in-memory samples.
+    """
+    samples = 10 ** 6
+    data = np.random.RandomState(0).standard_normal(samples)
+
+    visible, _ = benchmark(decimate, data, 0, samples, view_ds(samples))
+
+    assert len(visible) <= 2 * PLOT_LIMIT
+
+
+@pytest.fixture(scope='module')
+def pyramid_1e8(tmpdir_factory):
+    """
+    A pyramid of a 1e8 sample recording. Only the levels a zoomed out view can pick are filled, the raw samples and
+    the finest levels would take gigabytes.
+    """
+    samples = 10 ** 8
+    first_level = int(np.log(view_ds(samples)) / np.log(RECORDING_LOD_FACTOR))
+    f = h5py.File(str(tmpdir_factory.mktemp('lod').join('telemetry.h5')), 'w', libver='latest')
+    lod = TelemetryPyramid.create(f, ['altitude-ft'])
+    lengths = []
+
+    for level, dataset in enumerate(lod.levels, 1):
+        length = -(-samples // RECORDING_LOD_FACTOR ** level)
+        lengths.append(length)
+
+        if level >= first_level:
+            values = np.random.RandomState(level).standard_normal(length)
+            dataset.resize(length, axis=0)
+            dataset[:, 0, 0] = values - 1
+            dataset[:, 1, 0] = values + 1
+
+    lod.length_dataset[:] = lengths
+
+    yield lod, samples
+
+    f.close()
+
+
+@pytest.mark.benchmark(group='decimation')
+def test_read_lod_1e8(benchmark, pyramid_1e8):
+    """
+    HDF5Plot.update_hdf5_plot over a fully zoomed out view of a 1e8 sample recording, read from its pyramid.
+    """
+    lod, samples = pyramid_1e8
+
+    entries, _, _ = benchmark(read_lod, lod, 0, samples, view_ds(samples), 0)
+
+    assert len(entries) <= 2 * PLOT_LIMIT
+    assert len(lod.levels) == RECORDING_LOD_LEVELS
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from fixtures import FG_LS_TELEMETRY
+from uavsim.flightgear import FG_TELEMETRY_PATHS, read_fg_telemetry
+from uavsim.flightgear.client import TelnetClient
+from uavsim.flightgear.fake import FakeFlightGear
+from uavsim.flightgear.parser import PropertyParser
+
+FAKE_TELNET_PORT = 15402
+
+
+@pytest.mark.benchmark(group='flightgear')
+def test_parse_ls_responses(benchmark):
+    parser = PropertyParser()
+    values = benchmark(parser.parse, FG_LS_TELEMETRY)
+
+    assert values[parser.schema.index['airspeed-kt']] == 301.5427761
+
+
+@pytest.fixture
+def fake_flightgear():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    fake = FakeFlightGear()
+    loop.run_until_complete(fake.start_telnet('127.0.0.1', FAKE_TELNET_PORT))
+
+    yield loop
+
+    fake.stop()
+    # lets the connection handlers finish
+    loop.run_until_complete(asyncio.sleep(0.01))
+    loop.close()
+
+
+@pytest.mark.benchmark(group='flightgear')
+def test_read_fg_telemetry(benchmark, fake_flightgear):
+    """
+    One telemetry read round trip through TelnetClient against the fake FlightGear on localhost.
+    """
+    client = TelnetClient('127.0.0.1', FAKE_TELNET_PORT)
+    loop = fake_flightgear
+
+    record = benchmark(lambda: loop.run_until_complete(read_fg_telemetry(client, FG_TELEMETRY_PATHS)))
+    client.close()
+
+    assert record['airspeed-kt'] == 300.0
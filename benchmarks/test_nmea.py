@@ -0,0 +1,17 @@
+import pytest
+
+from uavsim.nmea import NMEA_SENTENCES, NMEAEncoder, nmea_checksum
+
+
+@pytest.mark.benchmark(group='nmea')
+def test_encode_nmea_sentences(benchmark, telemetry):
+    encoder = NMEAEncoder()
+    data = benchmark(encoder.encode, telemetry)
+    sentences = data.splitlines()
+
+    assert len(sentences) == len(NMEA_SENTENCES)
+
+    for sentence in sentences:
+        if not sentence.startswith(b'$EXINJ'):
+            payload, _, checksum = sentence[1:].partition(b'*')
+            assert int(checksum, 16) == nmea_checksum(payload)
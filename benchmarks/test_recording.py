@@ -0,0 +1,37 @@
+import pytest
+
+from uavsim.recording import TelemetryWriter
+from uavsim.telemetry import TelemetryCodec
+
+
+@pytest.fixture
+def writer(tmpdir):
+    writer = TelemetryWriter(str(tmpdir.join('telemetry.h5')))
+
+    yield writer
+
+    writer.close()
+
+
+@pytest.mark.benchmark(group='recording')
+def test_append_record(benchmark, writer, telemetry):
+    """
+    StatisticsComponent append path for sim.telemetry samples, flushes included.
+    """
+    benchmark(writer.append_record, telemetry)
+
+
+@pytest.mark.benchmark(group='recording')
+def test_append_dict(benchmark, writer, telemetry):
+    benchmark(writer.append_record, telemetry.to_dict())
+
+
+@pytest.mark.benchmark(group='recording')
+def test_append_frame(benchmark, writer, telemetry):
+    """
+    StatisticsComponent append path for a 50 sample sim.telemetry.batch frame.
+    """
+    codec = TelemetryCodec(telemetry.schema)
+    frame = codec.decode_frame(codec.encode_frame([telemetry.values] * 50))
+
+    benchmark(writer.append_frame, frame)
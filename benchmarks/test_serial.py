@@ -0,0 +1,62 @@
+import os
+import pty
+import select
+import tty
+
+import pytest
+
+from uavsim.serial_port import SerialPort
+
+UAV_LINES = b''.join(b'%d,%.3f\r\n' % (i % 8, i / 1000) for i in range(400))
+
+
+@pytest.fixture
+def serial_pair():
+    """
+    A SerialPort on a pty, with the master end standing in for the UAV.
+    """
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    port = SerialPort(os.ttyname(slave))
+
+    yield port, master
+
+    port.close()
+    os.close(slave)
+    os.close(master)
+
+
+@pytest.mark.benchmark(group='serial')
+def test_read_lines(benchmark, serial_pair):
+    """
+    Reading a burst of UAV command lines with bulk reads and memoryview framing.
+    """
+    port, master = serial_pair
+
+    def read_lines():
+        os.write(master, UAV_LINES)
+        count = 0
+
+        # the pty may hand the burst over in pieces
+        while count < 400:
+            select.select([port.fd], [], [], 1.0)
+            count += sum(1 for _ in port.read_lines())
+
+        return count
+
+    assert benchmark(read_lines) == 400
+
+
+@pytest.mark.benchmark(group='serial')
+def test_coalesced_write(benchmark, serial_pair):
+    port, master = serial_pair
+
+    def write():
+        for _ in range(10):
+            port.write(b'$EXINJ,267.7000,-2.1000,4.9000,267.7000,NA\n')
+
+        port.flush()
+        os.read(master, 4096)
+
+    benchmark(write)
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def envelope(values, ds):
+    """
+    Min/max envelope of complete ds-sample buckets along the first axis, for any number of channels at once.
+
+    Returns (m, 2, ...) entries holding the minimum and the maximum of every bucket, and the number of samples
+    consumed. Missing values (nan) are ignored.
+    """
+    count = len(values) // ds
+    buckets = values[:count * ds].reshape((count, ds) + values.shape[1:])
+
+    return np.stack((np.fmin.reduce(buckets, axis=1), np.fmax.reduce(buckets, axis=1)), axis=1), count * ds
+
+
+def reduce_envelope(entries, factor):
+    """
+    Combines every `factor` consecutive envelope entries into one, a trailing incomplete group included.
+    """
+    count = -(-len(entries) // factor)
+    padding = count * factor - len(entries)
+
+    if padding:
+        # nan entries are ignored by the reduction
+        entries = np.concatenate((entries, np.full((padding,) + entries.shape[1:], np.nan)))
+
+    entries = entries.reshape((count, factor) + entries.shape[1:])
+
+    return np.stack((np.fmin.reduce(entries[:, :, 0], axis=1), np.fmax.reduce(entries[:, :, 1], axis=1)), axis=1)
+
+
+def interleave(entries):
+    """
+    Flattens (m, 2, ...) envelope entries into min, max, min, max... plot points.
+    """
+    return entries.reshape((2 * len(entries),) + entries.shape[2:])
+
+
+def decimate(data, start, stop, ds):
+    """
+    Interleaved min/max envelope of complete ds-sample buckets of data[start:stop], computed in chunks of ~1M samples
+    to limit memory usage. Returns it with the end of the last complete bucket.
+    """
+    chunk_size = (1000000 // ds) * ds
+    pieces = [data[:0]]
+    source = start
+
+    while source + ds <= stop:
+        entries, consumed = envelope(data[source:min(stop, source + chunk_size)], ds)
+        pieces.append(interleave(entries))
+        source += consumed
+
+    return np.concatenate(pieces), source
+
+
+def read_lod(lod, start, stop, ds, columns):
+    """
+    Envelope of [start, stop) downsampled by `ds` samples per bucket. Reads the coarsest pyramid level whose buckets
+    hold at most `ds` samples and reduces it further in memory by the remaining factor, so every redraw reads a
+    bounded number of points. `columns` is a column index or a list of them, only those are read.
+
+    Returns the envelope entries, the position of the first one and the x scale of the interleaved plot points.
+    """
+    level = min(len(lod.levels), int(np.log(ds) / np.log(lod.factor) + 1e-9))
+    bucket = lod.factor ** level
+    first = start // bucket
+    last = min(lod.lengths()[level - 1], stop // bucket + 1)
+
+    if isinstance(columns, int):
+        entries = lod.levels[level - 1][first:last, :, columns]
+    else:
+        # h5py selects increasing column lists only
+        selection = sorted(set(columns))
+        entries = lod.levels[level - 1][first:last, :, selection][:, :, [selection.index(c) for c in columns]]
+
+    remaining = max(1, ds // bucket)
+
+    if remaining > 1:
+        entries = reduce_envelope(entries, remaining)
+
+    return entries, first * bucket, bucket * remaining * 0.5
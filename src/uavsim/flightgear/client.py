@@ -1,19 +1,46 @@
+import asyncio
+import collections
+import json
 import logging
-import re
 import socket
-import telnetlib
+
+from pkg_resources import resource_filename
+
+from uavsim.flightgear.generic import UAV_OUT_PROTOCOL, GenericProtocol
+from uavsim.flightgear.parser import PropertyParser
+from uavsim.telemetry import TelemetryRecord, utc_timestamp
 
 logger = logging.getLogger(__name__)
 
 
-AP_CMD_ENGINE0_THROTTLE = 1
-AP_CMD_ENGINE1_THROTTLE = 2
+# UAV command id -> FlightGear property, control surfaces, engines and autopilot
+FG_COMMAND_MAP = resource_filename('uavsim.resources', 'flightgear/commands.json')
+FG_PROMPT = b'/> '
+TELNET_TIMEOUT = 2.0
+TELNET_READ_LIMIT = 2 ** 20
+
+
+def load_command_map(path=FG_COMMAND_MAP):
+    """
+    Reads a JSON object mapping UAV command ids to FlightGear property paths.
+    """
+    with open(path) as f:
+        return {int(cmd_id): prop for cmd_id, prop in json.load(f).items()}
+
+
+FG_COMMANDS = load_command_map()
+
 
-FG_COMMANDS = {
-    AP_CMD_ENGINE0_THROTTLE: '/controls/engines/engine[0]/throttle',
-    AP_CMD_ENGINE1_THROTTLE: '/controls/engines/engine[1]/throttle'
-}
-FG_PROP_REGEXP = re.compile(r'([^=]*)\s+=\s*\'([^\']*)\'\s*\(([^\r]*)\)')
+def parse_command(line, commands=FG_COMMANDS):
+    """
+    Property sets of a UAV command line: `cmd_id,value` or a whole vector as `cmd_id,value,cmd_id,value...`.
+    """
+    fields = [field.strip() for field in line.strip().split(',')]
+
+    if len(fields) < 2 or len(fields) % 2:
+        raise ValueError('Expected cmd_id,value[,cmd_id,value...], got {!r}'.format(line))
+
+    return [(commands[int(cmd_id)], value) for cmd_id, value in zip(fields[::2], fields[1::2])]
 
 
 class AbstractClient(object):
@@ -23,80 +50,206 @@ class AbstractClient(object):
         self.conn = None
         self.last_cmds = {}
 
-    def connect(self):
+    async def connect(self):
         raise NotImplementedError
 
-    def read_telemetry(self):
+    def close(self):
+        pass
+
+    async def read_telemetry(self):
         pass
 
-    def send_command(self, cmd):
+    async def send_command(self, cmd):
         pass
 
-    def set_property(self, name, value):
+    async def set_property(self, name, value):
         pass
 
-    def set_position(self, lat, lon):
+    async def set_position(self, lat, lon):
         pass
 
 
 class TelnetClient(AbstractClient):
-    def connect(self):
+    """
+    Non-blocking client for the FlightGear telnet property server.
+
+    Requests are serialized with a lock, each one waits for the prompt at most `timeout` seconds. On timeout or
+    connection loss the connection is dropped and re-established by the next request.
+
+    UAV commands don't wait for FlightGear: their property sets are collected and sent as one pipelined batch per
+    round trip, a property keeping only its latest value and values equal to the last one sent being dropped. So a
+    batch of commands costs the telemetry reads one request of waiting, however many commands it holds.
+    """
+
+    def __init__(self, host, port, timeout=TELNET_TIMEOUT, commands=None):
+        super().__init__(host, port)
+        self.timeout = timeout
+        self.commands = FG_COMMANDS if commands is None else commands
+        self.reader = None
+        self._lock = None
+        self._parsers = {}
+        self._pending = collections.OrderedDict()
+        self._flusher = None
+
+    async def connect(self):
         if not self.conn:
-            self.conn = telnetlib.Telnet(host=self.host, port=self.port)
+            self.reader, self.conn = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=TELNET_READ_LIMIT), self.timeout
+            )
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+        self.reader = None
+        self.conn = None
 
-    def set_property(self, name, value):
+    async def _read_responses(self, count):
+        return [await self.reader.readuntil(FG_PROMPT) for _ in range(count)]
+
+    async def _request_many(self, cmds):
+        """
+        Pipelines all commands in a single write and returns their responses in the same order.
+        """
+        if self._lock is None:
+            # created lazily so that it binds to the loop the component runs in
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            await self.connect()
+
+            try:
+                self.conn.write(''.join(cmds).encode('ascii'))
+                await self.conn.drain()
+
+                return await asyncio.wait_for(self._read_responses(len(cmds)), self.timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                logger.warning('Telnet request {!r} to {}:{} failed, reconnecting'.format(cmds, self.host, self.port))
+                self.close()
+                raise
+
+    async def _request(self, cmd):
+        responses = await self._request_many([cmd])
+
+        return responses[0]
+
+    async def set_property(self, name, value):
         cmd = 'set {} {}\r\n'.format(name, value)
         logger.info(cmd)
 
-        self.conn.write(cmd.encode('ascii'))
-        self.conn.read_until(b'/> ')
+        await self._request(cmd)
+
+    async def set_properties(self, items):
+        """
+        Sets several properties with one write, waiting once for all of their prompts.
+        """
+        cmds = ['set {} {}\r\n'.format(name, value) for name, value in items]
+        logger.debug(cmds)
+
+        await self._request_many(cmds)
+
+    async def send_command(self, cmd):
+        """
+        Queues the property sets of a UAV command line and returns without waiting for FlightGear.
+        """
+        try:
+            sets = parse_command(cmd, self.commands)
+        except (KeyError, ValueError) as e:
+            logger.warning('Unknown UAV command {!r}: {}'.format(cmd, e))
+            return
 
-    def send_command(self, cmd):
-        cmd_id, data = cmd.split(',')
-        cmd_id = int(cmd_id)
+        pending = self._pending
 
-        last_cmd = self.last_cmds.get(cmd_id)
-        logger.info('{} {}'.format(cmd_id, last_cmd))
+        for name, value in sets:
+            if self.last_cmds.get(name) == value:
+                # undoes a queued change back to the value FlightGear already has
+                pending.pop(name, None)
+            else:
+                pending[name] = value
 
-        if last_cmd == data:
-            return
+        if pending and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.ensure_future(self._flush_commands())
+
+    async def _flush_commands(self):
+        while self._pending:
+            batch = self._pending
+            self._pending = collections.OrderedDict()
+            # counted as sent right away, so commands arriving meanwhile are deduplicated against it
+            self.last_cmds.update(batch)
+
+            try:
+                await self.set_properties(batch.items())
+            except (EOFError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                logger.warning('Unable to send commands to FG: {}'.format(dict(batch)))
 
-        self.set_property(FG_COMMANDS[cmd_id], data)
-        self.last_cmds[cmd_id] = data
+                for name in batch:
+                    if self.last_cmds.get(name) == batch[name]:
+                        del self.last_cmds[name]
 
-    def set_position(self, lat, lon):
-        self.set_property('position/latitude-deg', lat)
-        self.set_property('position/longitude-deg', lon)
+    async def set_position(self, lat, lon):
+        await self.set_properties((('position/latitude-deg', lat), ('position/longitude-deg', lon)))
 
-    def read_fg_data(self, path):
-        self.conn.write('ls {}\r\n'.format(path).encode('ascii'))
-        received_data = self.conn.read_until(b'/> ').decode('ascii')
-        telemetry = {}
+    def _parser(self, paths):
+        parser = self._parsers.get(paths)
 
-        for row in received_data.split('\r\n')[:-1]:
-            match = FG_PROP_REGEXP.match(row)
+        if parser is None:
+            parser = self._parsers[paths] = PropertyParser()
 
-            if not match:
-                continue
+        return parser
 
-            key, value, t = match.groups()
+    async def read_fg_data(self, path):
+        return await self.read_fg_data_batch((path,))
 
-            if not value:
-                continue
+    async def read_fg_data_batch(self, paths):
+        """
+        Reads several property subtrees in one round trip and returns them as a single TelemetryRecord.
+        """
+        paths = tuple(paths)
+        dt = utc_timestamp()
+        responses = await self._request_many(['ls {}\r\n'.format(path) for path in paths])
+        parser = self._parser(paths)
+        values = parser.parse(responses)
+        values[0] = dt
 
-            if t == 'double':
-                # TODO: use Decimal when AutobahnPython will start using cbor2 which supports this
-                value = float(value)
-            elif t == 'bool':
-                value = value == 'true'
+        return TelemetryRecord(parser.schema, values)
 
-            telemetry[key] = value
 
-        return telemetry
+class FGDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, protocol, on_telemetry):
+        self.protocol = protocol
+        self.on_telemetry = on_telemetry
+
+    def datagram_received(self, data, addr):
+        for telemetry in self.protocol.decode(data, utc_timestamp()):
+            self.on_telemetry(telemetry)
+
+    def error_received(self, exc):
+        logger.warning('UDP receive error: {}'.format(exc))
 
 
 class UDPClient(AbstractClient):
-    def connect(self):
+    def __init__(self, host, port, protocol_path=UAV_OUT_PROTOCOL):
+        super().__init__(host, port)
+        self.protocol = GenericProtocol.from_file(protocol_path)
+        self.transport = None
+
+    async def connect(self):
         if not self.conn:
             self.conn = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.conn.bind((self.host, self.port))
+            self.conn.setblocking(False)
+
+    async def listen(self, on_telemetry):
+        """
+        Starts pushing decoded telemetry to on_telemetry as FlightGear packets arrive.
+        """
+        loop = asyncio.get_event_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: FGDatagramProtocol(self.protocol, on_telemetry), sock=self.conn
+        )
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+            self.conn = None
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Stand-in for fgfs: serves the telnet property protocol and streams the generic UDP output for a synthetic flight.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import random
+import sys
+
+from uavsim.flightgear.client import FG_PROMPT
+from uavsim.flightgear.generic import UAV_OUT_PROTOCOL, GenericProtocol
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+FAKE_TELNET_PORT = 5401
+FAKE_UDP_PORT = 5500
+FAKE_RATE = 50.0
+FAKE_UDP_RATE = 10.0
+FAKE_READ_SIZE = 2 ** 16
+
+# EVRA, the airport used by uavsim.__main__.start_fgfs
+FAKE_ORIGIN = (56.92361111, 23.97111111)
+FAKE_RADIUS_M = 5000.0
+FAKE_ALTITUDE_FT = 2000.0
+FAKE_CLIMB_FT = 300.0
+FAKE_AIRSPEED_KT = 300.0
+FAKE_GROUND_ELEV_FT = 37.29654
+
+EARTH_RADIUS_M = 6371000.0
+FEET_PER_METER = 3.28084
+METERS_PER_SECOND_PER_KT = 0.514444
+FG_LINE_SEPARATOR = b'\r\n'
+
+FG_VALUE_TYPES = {
+    float: 'double',
+    int: 'int',
+    bool: 'bool',
+    str: 'string',
+}
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    return str(value)
+
+
+def _parse_value(value, t):
+    if t is bool:
+        return value in ('true', '1')
+
+    return t(value)
+
+
+def normalize_path(path, cwd='/'):
+    """
+    Absolute property path with the implicit [0] indexes dropped, so engine and engine[0] are the same node.
+    """
+    if not path.startswith('/'):
+        path = cwd.rstrip('/') + '/' + path
+
+    nodes = []
+
+    for node in path.split('/'):
+        if not node or node == '.':
+            continue
+
+        if node == '..':
+            if nodes:
+                nodes.pop()
+
+            continue
+
+        nodes.append(node[:-3] if node.endswith('[0]') else node)
+
+    return '/' + '/'.join(nodes)
+
+
+class PropertyTree(object):
+    """
+    Flat property store, values keep their python type which decides the type shown by `ls`.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.children = {'/': []}
+
+    def _add(self, path):
+        parent, _, name = path.rpartition('/')
+        parent = parent or '/'
+
+        if parent not in self.children:
+            self._add(parent)
+            self.children[parent] = []
+
+        self.children[parent].append(name)
+
+    def set(self, path, value):
+        path = normalize_path(path)
+
+        if path not in self.values:
+            self._add(path)
+
+        self.values[path] = value
+
+    def get(self, path):
+        return self.values.get(normalize_path(path))
+
+    def is_dir(self, path):
+        return normalize_path(path) in self.children
+
+    def ls(self, path):
+        path = normalize_path(path)
+        lines = []
+
+        for name in self.children.get(path, ()):
+            child = '/' + name if path == '/' else path + '/' + name
+
+            if child in self.children:
+                lines.append('{}/'.format(name))
+            else:
+                value = self.values[child]
+                lines.append("{} =\t'{}'\t({})".format(name, _format_value(value), FG_VALUE_TYPES[type(value)]))
+
+        return lines
+
+
+class CircuitTrajectory(object):
+    """
+    Deterministic flight around a circle at constant airspeed, climbing and descending sinusoidally once per lap.
+    """
+
+    def __init__(self, origin=FAKE_ORIGIN, radius=FAKE_RADIUS_M, airspeed=FAKE_AIRSPEED_KT,
+                 altitude=FAKE_ALTITUDE_FT, climb=FAKE_CLIMB_FT):
+        self.origin = origin
+        self.radius = radius
+        self.airspeed = airspeed
+        self.altitude = altitude
+        self.climb = climb
+        self.period = 2 * math.pi * radius / (airspeed * METERS_PER_SECOND_PER_KT)
+
+    def properties(self, t):
+        phase = 2 * math.pi * t / self.period
+        lat0, lon0 = self.origin
+        north = self.radius * math.sin(phase)
+        east = self.radius * (1 - math.cos(phase))
+        lat = lat0 + math.degrees(north / EARTH_RADIUS_M)
+        lon = lon0 + math.degrees(east / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+        altitude = self.altitude + self.climb * math.sin(phase)
+        vertical_speed = self.climb * math.cos(phase) * 2 * math.pi / self.period
+        speed_fps = self.airspeed * METERS_PER_SECOND_PER_KT * FEET_PER_METER
+        # coordinated turn: tan(roll) = v^2 / (g * r)
+        speed_ms = self.airspeed * METERS_PER_SECOND_PER_KT
+        roll = math.degrees(math.atan(speed_ms ** 2 / (9.80665 * self.radius)))
+
+        return (
+            ('/position/latitude-deg', lat),
+            ('/position/longitude-deg', lon),
+            ('/position/altitude-ft', altitude),
+            ('/position/altitude-agl-ft', altitude - FAKE_GROUND_ELEV_FT),
+            ('/position/ground-elev-ft', FAKE_GROUND_ELEV_FT),
+            ('/orientation/model/roll-deg', roll),
+            ('/orientation/model/pitch-deg', math.degrees(math.atan2(vertical_speed, speed_fps))),
+            ('/orientation/model/heading-deg', math.degrees(phase) % 360.0),
+            ('/velocities/airspeed-kt', self.airspeed),
+            ('/velocities/groundspeed-kt', self.airspeed),
+            ('/velocities/vertical-speed-fps', vertical_speed),
+            ('/velocities/on-ground', False),
+        )
+
+
+class FakeFlightGear(object):
+    """
+    Updates the property tree from a trajectory at `rate` Hz and serves it like fgfs does.
+
+    Every batch of telnet commands received together is answered after `latency` plus up to `jitter` seconds, like
+    fgfs which services its telnet server once per frame. The jitter is drawn from a seeded generator, so runs are
+    reproducible.
+    """
+
+    def __init__(self, trajectory=None, rate=FAKE_RATE, latency=0.0, jitter=0.0, seed=0,
+                 protocol_path=UAV_OUT_PROTOCOL):
+        self.trajectory = trajectory or CircuitTrajectory()
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.protocol = GenericProtocol.from_file(protocol_path)
+        self.tree = PropertyTree()
+        self.is_running = True
+        self.servers = []
+        self.transports = []
+        self.commands = 0
+
+        self.update(0.0)
+
+    def update(self, t):
+        for path, value in self.trajectory.properties(t):
+            self.tree.set(path, value)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        period = 1.0 / self.rate
+        tick = 0
+
+        while self.is_running:
+            tick += 1
+            await asyncio.sleep(max(0.0, start + tick * period - loop.time()))
+            self.update(loop.time() - start)
+
+    def handle_command(self, line, cwd):
+        """
+        Returns the response lines and the new working directory for one command line.
+        """
+        cmd, _, args = line.strip().partition(' ')
+        args = args.strip()
+
+        if not cmd:
+            return [], cwd
+
+        if cmd == 'ls':
+            return self.tree.ls(normalize_path(args, cwd)), cwd
+
+        if cmd == 'get':
+            return [_format_value(self.tree.get(normalize_path(args, cwd)))], cwd
+
+        if cmd == 'set':
+            path, _, value = args.partition(' ')
+            path = normalize_path(path, cwd)
+            current = self.tree.get(path)
+            value = value.strip()
+
+            try:
+                value = _parse_value(value, type(current)) if current is not None else float(value)
+            except ValueError:
+                pass
+
+            self.tree.set(path, value)
+
+            return [], cwd
+
+        if cmd == 'cd':
+            path = normalize_path(args or '/', cwd)
+
+            if self.tree.is_dir(path):
+                return [], path
+
+            return ['node not found'], cwd
+
+        if cmd == 'pwd':
+            return [cwd], cwd
+
+        return ['Unknown command: {}'.format(cmd)], cwd
+
+    async def handle_client(self, reader, writer):
+        cwd = '/'
+        pending = b''
+
+        try:
+            while True:
+                data = await reader.read(FAKE_READ_SIZE)
+
+                if not data:
+                    break
+
+                *lines, pending = (pending + data).split(b'\n')
+
+                if not lines:
+                    continue
+
+                if self.latency or self.jitter:
+                    await asyncio.sleep(self.latency + self.random.uniform(0.0, self.jitter))
+
+                responses = []
+
+                for line in lines:
+                    line = line.decode('ascii', 'replace').rstrip('\r')
+
+                    if line.strip() in ('quit', 'exit'):
+                        writer.close()
+
+                        return
+
+                    output, cwd = self.handle_command(line, cwd)
+                    responses.extend(out.encode('ascii') + FG_LINE_SEPARATOR for out in output)
+                    responses.append(FG_PROMPT)
+                    self.commands += 1
+
+                writer.write(b''.join(responses))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start_telnet(self, host='127.0.0.1', port=FAKE_TELNET_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        self.servers.append(server)
+        logger.info('Telnet property server listening on {}:{}'.format(host, port))
+
+        return server
+
+    def encode_generic(self):
+        return self.protocol.encode([self.tree.get(node) for node in self.protocol.nodes])
+
+    async def stream_udp(self, host='127.0.0.1', port=FAKE_UDP_PORT, rate=FAKE_UDP_RATE):
+        """
+        Sends the generic protocol output to host:port at `rate` Hz, one line per datagram.
+        """
+        loop = asyncio.get_event_loop()
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        self.transports.append(transport)
+        logger.info('Streaming generic UDP output to {}:{} at {} Hz'.format(host, port, rate))
+        start = loop.time()
+        tick = 0
+
+        while self.is_running:
+            transport.sendto(self.encode_generic())
+            tick += 1
+            await asyncio.sleep(max(0.0, start + tick / rate - loop.time()))
+
+    def stop(self):
+        self.is_running = False
+
+        for server in self.servers:
+            server.close()
+
+        for transport in self.transports:
+            transport.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fake FlightGear',
+    )
+    parser.add_argument(
+        '--telnet-host',
+        dest='telnet_host',
+        help='Telnet property server host',
+        default='127.0.0.1'
+    )
+    parser.add_argument(
+        '--telnet-port',
+        dest='telnet_port',
+        help='Telnet property server port, 0 disables it',
+        type=int,
+        default=FAKE_TELNET_PORT
+    )
+    parser.add_argument(
+        '--udp-out-host',
+        dest='udp_out_host',
+        help='Host to stream the generic protocol output to, streaming is disabled without it',
+        default=None
+    )
+    parser.add_argument(
+        '--udp-out-port',
+        dest='udp_out_port',
+        help='Port to stream the generic protocol output to',
+        type=int,
+        default=FAKE_UDP_PORT
+    )
+    parser.add_argument(
+        '--udp-rate',
+        dest='udp_rate',
+        help='Generic protocol output rate, Hz',
+        type=float,
+        default=FAKE_UDP_RATE
+    )
+    parser.add_argument(
+        '--rate',
+        dest='rate',
+        help='Trajectory update rate, Hz',
+        type=float,
+        default=FAKE_RATE
+    )
+    parser.add_argument(
+        '--latency',
+        dest='latency',
+        help='Delay of every telnet response, ms',
+        type=float,
+        default=0.0
+    )
+    parser.add_argument(
+        '--jitter',
+        dest='jitter',
+        help='Random extra delay of every telnet response, up to this many ms',
+        type=float,
+        default=0.0
+    )
+    parser.add_argument(
+        '--seed',
+        dest='seed',
+        help='Seed of the jitter',
+        type=int,
+        default=0
+    )
+
+    args = parser.parse_args(sys.argv[1:])
+    fake = FakeFlightGear(rate=args.rate, latency=args.latency / 1000, jitter=args.jitter / 1000, seed=args.seed)
+    loop = asyncio.get_event_loop()
+
+    if args.telnet_port:
+        loop.run_until_complete(fake.start_telnet(args.telnet_host, args.telnet_port))
+
+    tasks = [fake.run()]
+
+    if args.udp_out_host:
+        tasks.append(fake.stream_udp(args.udp_out_host, args.udp_out_port, args.udp_rate))
+
+    try:
+        loop.run_until_complete(asyncio.gather(*tasks))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
@@ -0,0 +1,120 @@
+import logging
+import xml.etree.ElementTree as ElementTree
+
+from pkg_resources import resource_filename
+
+from uavsim.telemetry import TELEMETRY_TIMESTAMP, TelemetryRecord, TelemetrySchema
+
+logger = logging.getLogger(__name__)
+
+
+UAV_OUT_PROTOCOL = resource_filename('uavsim.resources', 'flightgear/uav_out.xml')
+
+FG_SEPARATORS = {
+    'newline': '\n',
+    'carriagereturn': '\r',
+    'tab': '\t',
+    'space': ' ',
+    'comma': ',',
+    'semicolon': ';',
+}
+
+
+def _parse_bool(value):
+    return value in ('1', 'true')
+
+
+FG_GENERIC_TYPES = {
+    'int': (int, int),
+    'bool': (_parse_bool, bool),
+    'float': (float, float),
+    'double': (float, float),
+    'fixed': (float, float),
+    'string': (str, str),
+}
+
+
+class GenericProtocol(object):
+    """
+    ASCII FlightGear generic protocol definition (the <output> section of a Protocol/*.xml file).
+    """
+
+    def __init__(self, chunks, var_separator=',', line_separator='\n', nodes=None, formats=None):
+        self.chunks = tuple(chunks)
+        self.casts = tuple(cast for _, cast, _ in self.chunks)
+        self.schema = TelemetrySchema(((TELEMETRY_TIMESTAMP, float),) + tuple((n, t) for n, _, t in self.chunks))
+        self.var_separator = var_separator
+        self.line_separator = line_separator
+        # property paths and printf formats of the chunks, only needed to produce output
+        self.nodes = tuple(nodes) if nodes else ()
+        self.formats = tuple(formats) if formats else ('%s',) * len(self.chunks)
+
+    @staticmethod
+    def _separator(value, default):
+        if value is None:
+            return default
+
+        return FG_SEPARATORS.get(value, value)
+
+    @classmethod
+    def from_file(cls, path, direction='output'):
+        root = ElementTree.parse(path).getroot()
+        section = root.find('generic/{}'.format(direction))
+
+        if section is None:
+            raise ValueError('No generic/{} section in {}'.format(direction, path))
+
+        if section.findtext('binary_mode', 'false').strip() == 'true':
+            raise ValueError('Binary generic protocols are not supported: {}'.format(path))
+
+        chunks = []
+        nodes = []
+        formats = []
+
+        for chunk in section.iter('chunk'):
+            name = chunk.findtext('name').strip()
+            chunk_type = chunk.findtext('type', 'int').strip()
+            chunks.append((name,) + FG_GENERIC_TYPES[chunk_type])
+            nodes.append(chunk.findtext('node', '').strip())
+            formats.append(chunk.findtext('format', '%s').strip())
+
+        return cls(
+            chunks,
+            var_separator=cls._separator(section.findtext('var_separator'), ','),
+            line_separator=cls._separator(section.findtext('line_separator'), '\n'),
+            nodes=nodes,
+            formats=formats,
+        )
+
+    def encode(self, values):
+        """
+        Formats one line of chunk values the way FlightGear sends it.
+        """
+        line = self.var_separator.join(f % value for f, value in zip(self.formats, values))
+
+        return (line + self.line_separator).encode('ascii')
+
+    def decode_line(self, line, dt=None):
+        values = line.split(self.var_separator)
+
+        if len(values) != len(self.chunks):
+            raise ValueError('Expected {} values, got {}'.format(len(self.chunks), len(values)))
+
+        return TelemetryRecord(self.schema, [dt] + [cast(value) for cast, value in zip(self.casts, values)])
+
+    def decode(self, data, dt=None):
+        """
+        Decodes a datagram into a list of TelemetryRecords, one per line, all stamped with dt.
+        """
+        records = []
+
+        for line in data.decode('ascii').split(self.line_separator):
+            if not line:
+                continue
+
+            try:
+                records.append(self.decode_line(line, dt))
+            except ValueError as e:
+                logger.warning('Malformed generic protocol line {!r}: {}'.format(line, e))
+
+        return records
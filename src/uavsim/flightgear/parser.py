@@ -0,0 +1,156 @@
+import logging
+import re
+
+from uavsim.telemetry import TELEMETRY_TIMESTAMP, TelemetrySchema
+
+logger = logging.getLogger(__name__)
+
+
+FG_PROP_REGEXP = re.compile(r'([^=]*)\s+=\s*\'([^\']*)\'\s*\(([^\r]*)\)')
+FG_LINE_SEPARATOR = b'\r\n'
+FG_QUOTE = b'\''
+
+
+def _parse_bool(value):
+    return value == b'true'
+
+
+def _parse_string(value):
+    return value.decode('ascii')
+
+
+# Casts operate on raw bytes, float()/int() accept them directly
+FG_PROPERTY_CASTS = {
+    'double': float,
+    'float': float,
+    'int': int,
+    'long': int,
+    'bool': _parse_bool,
+}
+FG_PROPERTY_TYPES = {
+    float: float,
+    int: int,
+    _parse_bool: bool,
+    _parse_string: str,
+}
+
+
+def parse_property_line(line):
+    """
+    Parses a single `ls` output line with the generic regular expression.
+
+    Returns a (key, raw value, cast) tuple or None for lines that are not properties.
+    """
+    match = FG_PROP_REGEXP.match(line.decode('ascii', 'replace'))
+
+    if not match:
+        return None
+
+    key, value, t = match.groups()
+
+    return key, value.encode('ascii', 'replace'), FG_PROPERTY_CASTS.get(t, _parse_string)
+
+
+def split_lines(responses):
+    lines = []
+
+    for response in responses:
+        # every response is terminated by the prompt
+        lines.extend(response.split(FG_LINE_SEPARATOR)[:-1])
+
+    return lines
+
+
+class PropertyParser(object):
+    """
+    Parses `ls` responses for a fixed set of property subtrees into fixed-layout value lists.
+
+    Splitting a whole batch of responses on quotes leaves property values at odd positions, while everything in
+    between (names, types, line separators and prompts) stays the same from sample to sample. The first sample
+    resolves the schema and that layout, every following sample is parsed with one split and one comparison of the
+    separators. The regular expression is only used again when the layout no longer matches.
+
+    The schema starts with the telemetry timestamp, which is left for the caller to fill in.
+    """
+
+    def __init__(self):
+        self.schema = None
+        self._separators = None
+        self._slots = ()
+        self._casts = ()
+
+    def _resolve_schema(self, props):
+        fields = [(TELEMETRY_TIMESTAMP, float)]
+        names = {TELEMETRY_TIMESTAMP}
+
+        for key, _, cast in props:
+            if key not in names:
+                names.add(key)
+                fields.append((key, FG_PROPERTY_TYPES[cast]))
+
+        self.schema = TelemetrySchema(fields)
+
+    def _resolve_layout(self, lines, separators):
+        props = []
+        quoted = True
+
+        for line in lines:
+            prop = parse_property_line(line)
+            quotes = line.count(FG_QUOTE)
+
+            if prop:
+                props.append(prop)
+                quoted = quoted and quotes == 2
+            else:
+                quoted = quoted and quotes == 0
+
+        if self.schema is None:
+            self._resolve_schema(props)
+
+        # values containing quotes would shift the positions, such layouts are always parsed line by line
+        self._separators = separators if quoted else None
+        self._slots = tuple(self.schema.index.get(key) for key, _, _ in props)
+        self._casts = tuple(cast for _, _, cast in props)
+
+    def _parse_lines(self, lines):
+        values = [None] * len(self.schema)
+
+        for line in lines:
+            prop = parse_property_line(line)
+
+            if not prop:
+                continue
+
+            key, value, cast = prop
+            slot = self.schema.index.get(key)
+
+            if slot is not None and value:
+                values[slot] = cast(value)
+
+        return values
+
+    def parse(self, responses):
+        """
+        Parses raw responses (each terminated by the prompt) into a list of values laid out as self.schema.
+        """
+        parts = b''.join(responses).split(FG_QUOTE)
+        separators = parts[0::2]
+
+        if separators != self._separators:
+            lines = split_lines(responses)
+
+            if self._separators is not None:
+                logger.debug('Property layout changed, resolving it again')
+
+            self._resolve_layout(lines, separators)
+
+            if self._separators is None:
+                return self._parse_lines(lines)
+
+        values = [None] * len(self.schema)
+
+        for value, slot, cast in zip(parts[1::2], self._slots, self._casts):
+            if value and slot is not None:
+                values[slot] = cast(value)
+
+        return values
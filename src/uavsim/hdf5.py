@@ -1,3 +1,4 @@
+import argparse
 import faulthandler
 import sys
 
@@ -6,28 +7,132 @@ import h5py
 import pyqtgraph as pg
 from qtpy import QtGui
 
+from uavsim.decimation import decimate, interleave, read_lod
+from uavsim.recording import (
+    RECORDING_GROUP, RECORDING_LENGTH, RECORDING_VALUES, recording_columns, recording_items, recording_length,
+    recording_lod
+)
+
 faulthandler.enable()
 
 
+# initial number of samples held in memory by a plot
+HDF5_PLOT_CAPACITY = 2**16
+
+
+class LoadedRows(object):
+    """
+    The rows [offset, offset + length) of a recording that are held in memory, read with `read(start, stop)`.
+
+    Rows are only read once they come into view, the recording can be much longer than what was ever plotted. Rows
+    adjoining the loaded ones are added to them, so a view following a live recording only reads the new rows of every
+    tick. A view moved past the loaded rows replaces them.
+    """
+
+    def __init__(self, read, total=0):
+        self.read = read
+        # rows in the recording
+        self.total = total
+        self.data = None
+        self.offset = 0
+        self.length = 0
+
+    @property
+    def end(self):
+        return self.offset + self.length
+
+    def load(self, start, stop):
+        """
+        Makes sure the rows [start, stop) of the recording are in memory.
+        """
+        start, stop = max(0, start), min(self.total, stop)
+
+        if start >= stop:
+            return
+
+        if self.data is None or stop < self.offset or start > self.end:
+            self.data, self.length = append_rows(None, 0, self.read(start, stop))
+            self.offset = start
+
+            return
+
+        if start < self.offset:
+            # at least doubles the loaded rows, so panning back copies them O(log N) times
+            first = max(0, min(start, self.offset - self.length))
+            self.data = np.concatenate((self.read(first, self.offset), self.data[:self.length]))
+            self.length += self.offset - first
+            self.offset = first
+
+        if stop > self.end:
+            self.data, self.length = append_rows(self.data, self.length, self.read(self.end, stop))
+
+    def rows(self, start, stop):
+        return self.data[start - self.offset:stop - self.offset]
+
+
 class HDF5Plot(pg.PlotCurveItem):
     def __init__(self, *args, **kwds):
-        self.hdf5 = None
+        self.rows = None
+        self._envelope = None
         self.limit = 10000  # maximum number of samples to be plotted
+        self.lod = None
+        self.lod_column = None
         pg.PlotCurveItem.__init__(self, *args, **kwds)
 
+    def set_lod(self, lod, field):
+        """
+        Uses the min/max pyramid of the recording for zoomed out views, when it covers the field.
+        """
+        if lod is not None and field in lod.index:
+            self.lod = lod
+            self.lod_column = lod.index[field]
+
     def set_hdf5(self, data):
-        self.hdf5 = data
+        data = np.asarray(data)
+        self.set_source(lambda start, stop: data[start:stop], len(data))
+
+    def set_source(self, read, length):
+        """
+        Plots `length` samples read with `read(start, stop)` as they come into view.
+        """
+        self.rows = LoadedRows(read, length)
+        self._envelope = None
         self.update_hdf5_plot()
 
-    def append_hdf5(self, data):
-        self.hdf5 = np.append(self.hdf5, data) if self.hdf5 is not None else data
-        self.update_hdf5_plot()
+    @property
+    def length(self):
+        return self.rows.total if self.rows else 0
+
+    def grow_hdf5(self, length):
+        """
+        The source grew to `length` samples. The plot is only redrawn, reading the new samples, when they are in view.
+        """
+        first = self.rows.total
+
+        if length == first:
+            return
+
+        self.rows.total = length
+        vb = self.getViewBox()
+
+        if vb is None or first <= vb.viewRange()[0][1] + 2:
+            self.update_hdf5_plot()
 
     def viewRangeChanged(self):
         self.update_hdf5_plot()
 
+    def decimate(self, start, stop, ds):
+        """
+        Min/max envelope of complete ds-sample buckets in [start, stop), interleaved. Returns it with the end of the
+        last complete bucket.
+        """
+        offset = self.rows.offset
+        visible, covered = decimate(self.rows.data, start - offset, stop - offset, ds)
+
+        return visible, covered + offset
+
     def update_hdf5_plot(self):
-        if self.hdf5 is None:
+        if self.rows is None:
             self.setData([])
             return
 
@@ -39,82 +144,266 @@ class HDF5Plot(pg.PlotCurveItem):
         # Determine what data range must be read from HDF5
         xrange = vb.viewRange()[0]
         start = max(0, int(xrange[0]) - 1)
-        stop = min(len(self.hdf5), int(xrange[1] + 2))
+        stop = max(start, min(self.rows.total, int(xrange[1] + 2)))
 
         # Decide by how much we should downsample
         ds = int((stop - start) / self.limit) + 1
 
+        if self.lod is not None and ds >= self.lod.factor:
+            self.update_lod_plot(start, stop, ds)
+            return
+
+        # only the samples in view are read, zoomed out views are served by the pyramid above
+        self.rows.load(start, stop)
+
+        if self.rows.data is None:
+            self.setData([])
+            return
+
         if ds == 1:
             # Small enough to display with no intervention.
-            visible = self.hdf5[start:stop]
+            visible = self.rows.rows(start, stop)
             scale = 1
         else:
-            # Here convert data into a down-sampled array suitable for visualizing.
-            # Must do this piecewise to limit memory usage.
-            samples = 1 + ((stop - start) // ds)
-            visible = np.zeros(samples * 2, dtype=self.hdf5.dtype)
-            sourcePtr = start
-            targetPtr = 0
+            # While the view and the bucket size stay the same, only buckets completed since the last redraw are
+            # decimated, which keeps live updates at a constant cost.
+            if self._envelope is not None and self._envelope[:2] == (start, ds) and self._envelope[3] <= stop:
+                _, _, visible, covered = self._envelope
+                tail, covered = self.decimate(covered, stop, ds)
+                visible = np.concatenate((visible, tail))
+            else:
+                visible, covered = self.decimate(start, stop, ds)
+
+            self._envelope = (start, ds, visible, covered)
+            scale = ds * 0.5
 
-            # read data in chunks of ~1M samples
-            chunkSize = (1000000 // ds) * ds
+        self.setData(visible)  # update the plot
+        self.setPos(start, 0)  # shift to match starting index
+        self.resetTransform()
+        self.scale(scale, 1)  # scale to match downsampling
 
-            while sourcePtr < stop - 1:
-                chunk = self.hdf5[sourcePtr:min(stop, sourcePtr + chunkSize)]
-                sourcePtr += len(chunk)
+    def update_lod_plot(self, start, stop, ds):
+        entries, pos, scale = read_lod(self.lod, start, stop, ds, self.lod_column)
 
-                # reshape chunk to be integral multiple of ds
-                chunk = chunk[:(len(chunk) // ds) * ds].reshape(len(chunk) // ds, ds)
+        # interleave min and max into plot data to preserve envelope shape
+        self.setData(interleave(entries))
+        self.setPos(pos, 0)
+        self.resetTransform()
+        self.scale(scale, 1)
 
-                # compute max and min
-                chunkMax = chunk.max(axis=1)
-                chunkMin = chunk.min(axis=1)
 
-                # interleave min and max into plot data to preserve envelope shape
-                visible[targetPtr:targetPtr + chunk.shape[0] * 2:2] = chunkMin
-                visible[1 + targetPtr:1 + targetPtr + chunk.shape[0] * 2:2] = chunkMax
-                targetPtr += chunk.shape[0] * 2
+class HDF5MultiPlot(object):
+    """
+    Linked plots of several telemetry fields of one recording.
 
-            visible = visible[:targetPtr]
-            scale = ds * 0.5
+    The selected fields are kept side by side in one (n, channels) array, so each redraw decimates every channel in a
+    single vectorized pass over the visible range, and zoomed out views read all channels from one pyramid level.
+    """
 
-        self.setData(visible)  # update the plot
-        self.setPos(start, 0)  # shift to match starting index
-        self.resetTransform()
-        self.scale(scale, 1)  # scale to match downsampling
+    def __init__(self, layout, fields, read, lod=None, limit=10000):
+        self.fields = tuple(fields)
+        self.limit = limit
+        self.lod = None
+        self.lod_columns = None
+        self.plots = []
+        self.curves = []
+        # read(start, stop) returns (n, channels) rows of the fields
+        self.rows = LoadedRows(read)
+
+        if lod is not None and all(field in lod.index for field in self.fields):
+            self.lod = lod
+            self.lod_columns = [lod.index[field] for field in self.fields]
+
+        for row, field in enumerate(self.fields):
+            plot = layout.addPlot(row=row, col=0, title=field)
+            curve = pg.PlotCurveItem()
+            plot.addItem(curve)
+
+            if self.plots:
+                plot.setXLink(self.plots[0])
+
+            self.plots.append(plot)
+            self.curves.append(curve)
+
+        # the x ranges are linked, one redraw for all of them is enough
+        self.plots[0].sigXRangeChanged.connect(self.update_plots)
+
+    @property
+    def length(self):
+        return self.rows.total
+
+    def grow(self, length):
+        """
+        The recording grew to `length` rows, redrawing, and reading the new rows, only when they are in view.
+        """
+        first = self.rows.total
+
+        if length == first:
+            return
+
+        self.rows.total = length
+
+        if first <= self.plots[0].viewRange()[0][1] + 2:
+            self.update_plots()
+
+    def update_plots(self, *args):
+        rows = self.rows
+        xrange = self.plots[0].viewRange()[0]
+        start = max(0, int(xrange[0]) - 1)
+        stop = max(start, min(rows.total, int(xrange[1] + 2)))
+        ds = int((stop - start) / self.limit) + 1
+
+        if self.lod is not None and ds >= self.lod.factor:
+            entries, pos, scale = read_lod(self.lod, start, stop, ds, self.lod_columns)
+            visible = interleave(entries)
+        else:
+            rows.load(start, stop)
+
+            if rows.data is None:
+                return
+
+            if ds == 1:
+                visible, pos, scale = rows.rows(start, stop), start, 1
+            else:
+                visible, _ = decimate(rows.data, start - rows.offset, stop - rows.offset, ds)
+                pos, scale = start, ds * 0.5
+
+        for channel, curve in enumerate(self.curves):
+            curve.setData(visible[:, channel])
+            curve.setPos(pos, 0)
+            curve.resetTransform()
+            curve.scale(scale, 1)
 
 
+def append_rows(data, length, rows):
+    """
+    Appends rows into the spare capacity of data, which is doubled when exhausted, so the history is copied O(log N)
+    times. Returns the (possibly reallocated) array and the new length.
+    """
+    rows = np.asarray(rows)
+
+    if data is None:
+        data = np.empty((max(HDF5_PLOT_CAPACITY, len(rows)),) + rows.shape[1:], dtype=rows.dtype)
+    elif length + len(rows) > len(data):
+        grown = np.empty((max(2 * len(data), length + len(rows)),) + data.shape[1:], dtype=data.dtype)
+        grown[:length] = data[:length]
+        data = grown
+
+    data[length:length + len(rows)] = rows
+
+    return data, length + len(rows)
+
+
+HDF5_DEFAULT_FIELD = 'airspeed-kt'
+
 f = None
 curve = None
+multi_plot = None
+fields = (HDF5_DEFAULT_FIELD,)
 
 
 def update():
     global f
 
-    current_len = len(curve.hdf5) if curve.hdf5 is not None else 0
-    f['telemetry']['block0_values'].refresh()
-    curve.append_hdf5(f['telemetry']['block0_values'][current_len:, 1])
+    telemetry = f[RECORDING_GROUP]
+
+    if RECORDING_LENGTH in telemetry:
+        telemetry[RECORDING_LENGTH].refresh()
+
+    viewer = multi_plot or curve
+    lod = viewer.lod
+    length = recording_length(telemetry) if RECORDING_LENGTH in telemetry else None
+
+    if length == viewer.length:
+        return
+
+    values = telemetry[RECORDING_VALUES]
+    values.refresh()
+
+    if lod is not None:
+        lod.length_dataset.refresh()
+
+        for level in lod.levels:
+            level.refresh()
+
+    length = recording_length(telemetry)
+
+    # the plots read the rows in view only, a view following the recording reads just the rows of this tick
+    if multi_plot:
+        multi_plot.grow(length)
+    else:
+        curve.grow_hdf5(length)
+
+
+def read_field(start, stop):
+    return f[RECORDING_GROUP][RECORDING_VALUES].fields(fields[0])[start:stop]
+
+
+def read_fields(start, stop):
+    return recording_columns(f[RECORDING_GROUP][RECORDING_VALUES].fields(list(fields))[start:stop], fields)
 
 
 # Start Qt event loop unless running in interactive mode or using pyside.
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        pg.mkQApp()
-
+    parser = argparse.ArgumentParser(
+        description='Live viewer of recorded telemetry',
+    )
+    parser.add_argument(
+        'path',
+        help='Recording file'
+    )
+    parser.add_argument(
+        '--field',
+        dest='fields',
+        help='Telemetry field to plot, repeat for linked plots of several fields (default: {})'.format(
+            HDF5_DEFAULT_FIELD
+        ),
+        action='append'
+    )
+    parser.add_argument(
+        '--list-fields',
+        dest='list_fields',
+        help='Print the recorded fields and exit',
+        action='store_true'
+    )
+
+    args = parser.parse_args(sys.argv[1:])
+
+    f = h5py.File(args.path, 'r', swmr=True)
+    items = recording_items(f[RECORDING_GROUP])
+
+    if args.list_fields:
+        print('\n'.join(items))
+        sys.exit()
+
+    fields = tuple(args.fields or fields)
+    unknown = [field for field in fields if field not in items]
+
+    if unknown:
+        parser.error('Unknown fields: {}'.format(', '.join(unknown)))
+
+    pg.mkQApp()
+
+    if len(fields) > 1:
+        window = pg.GraphicsLayoutWidget()
+        window.setWindowTitle('Telemetry: {}'.format(args.path))
+        multi_plot = HDF5MultiPlot(window, fields, read_fields, recording_lod(f[RECORDING_GROUP]))
+        multi_plot.plots[0].setXRange(5500, 8000)
+        window.show()
+    else:
         plt = pg.plot()
-        plt.setWindowTitle('pyqtgraph example: HDF5 big data')
+        plt.setWindowTitle('Telemetry: {}'.format(args.path))
         plt.enableAutoRange(True, True)
         plt.setXRange(5500, 8000)
 
-        fileName = sys.argv[1]
-
-        f = h5py.File(fileName, 'r', swmr=True)
         curve = HDF5Plot()
+        curve.set_lod(recording_lod(f[RECORDING_GROUP]), fields[0])
+        curve.set_source(read_field, 0)
         plt.addItem(curve)
 
-        timer = pg.QtCore.QTimer()
-        timer.timeout.connect(update)
-        timer.start(50)
+    timer = pg.QtCore.QTimer()
+    timer.timeout.connect(update)
+    timer.start(50)
 
-        if (sys.flags.interactive != 1) or not hasattr(pg.QtCore, 'PYQT_VERSION'):
-            QtGui.QApplication.instance().exec_()
+    if (sys.flags.interactive != 1) or not hasattr(pg.QtCore, 'PYQT_VERSION'):
+        QtGui.QApplication.instance().exec_()
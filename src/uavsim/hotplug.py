@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+import pyudev
+
+logger = logging.getLogger(__name__)
+
+
+# the flight controller's CDC ACM interface
+UAV_PRODUCT = 'f055/9800/200'
+UAV_INTERFACE = '2/2/1'
+
+
+class DeviceMonitor(object):
+    """
+    Live table of the tty devices of matching USB interfaces, kept up to date from udev without blocking the loop.
+
+    The netlink monitor fd is registered with loop.add_reader and handled as events arrive. tty devices are watched
+    rather than their USB interfaces, so a device is only announced once udev created its /dev node and it can be
+    opened right away.
+    """
+
+    def __init__(self, product=UAV_PRODUCT, interface=UAV_INTERFACE, on_add=None, on_remove=None, loop=None):
+        self.product = product
+        self.interface = interface
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self.loop = loop or asyncio.get_event_loop()
+        self.context = pyudev.Context()
+        self.monitor = None
+        # sys_path -> device node
+        self.devices = {}
+
+    def matches(self, device):
+        parent = device.find_parent('usb', 'usb_interface')
+
+        return (
+            parent is not None and device.device_node is not None and
+            parent.properties.get('PRODUCT') == self.product and parent.properties.get('INTERFACE') == self.interface
+        )
+
+    def start(self):
+        self.monitor = pyudev.Monitor.from_netlink(self.context)
+        self.monitor.filter_by('tty')
+        self.monitor.start()
+        # enumerate after the monitor started, so a device plugged in meanwhile isn't missed
+        for device in self.context.list_devices(subsystem='tty'):
+            if self.matches(device):
+                self._add(device)
+
+        self.loop.add_reader(self.monitor.fileno(), self._ready)
+
+    def _add(self, device):
+        if device.sys_path in self.devices:
+            return
+
+        self.devices[device.sys_path] = device.device_node
+        logger.info('Device {} attached'.format(device.device_node))
+
+        if self.on_add:
+            self.on_add(device.device_node)
+
+    def _remove(self, device):
+        # the removed device is gone from sysfs, so it is looked up by path instead of matched
+        path = self.devices.pop(device.sys_path, None)
+
+        if path is None:
+            return
+
+        logger.info('Device {} detached'.format(path))
+
+        if self.on_remove:
+            self.on_remove(path)
+
+    def _ready(self):
+        while True:
+            device = self.monitor.poll(timeout=0)
+
+            if device is None:
+                return
+
+            if device.action == 'add' and self.matches(device):
+                self._add(device)
+            elif device.action == 'remove':
+                self._remove(device)
+
+    def stop(self):
+        if self.monitor is not None:
+            self.loop.remove_reader(self.monitor.fileno())
+            self.monitor = None
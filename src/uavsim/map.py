@@ -11,9 +11,11 @@ from PyQt5.QtCore import pyqtSlot, QObject, pyqtSignal
 from PyQt5.QtGui import QGuiApplication
 from PyQt5.QtQml import QQmlApplicationEngine
 from autobahn.asyncio.wamp import ApplicationRunner, ApplicationSession
-from autobahn.wamp import RegisterOptions
+from autobahn.wamp import RegisterOptions, SubscribeOptions
 from pkg_resources import resource_filename
 
+from uavsim.telemetry import TELEMETRY_SCHEMA_TOPIC, TELEMETRY_TOPIC, TelemetryDecoder
+
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -25,9 +27,15 @@ class MapComponent(ApplicationSession):
         ApplicationSession.__init__(self, config)
         self.queue_to_ui = config.extra['queue_to_ui']
         self.queue_out = config.extra['queue_out']
+        self.telemetry_decoder = TelemetryDecoder()
         self.is_running = False
 
     async def on_sim_telemetry(self, telemetry):
+        telemetry = self.telemetry_decoder.decode(telemetry)
+
+        if telemetry is None:
+            return
+
         try:
             lat = telemetry['latitude-deg']
             lng = telemetry['longitude-deg']
@@ -54,7 +62,10 @@ class MapComponent(ApplicationSession):
     async def onJoin(self, details):
         await self.register(self, options=RegisterOptions(invoke='roundrobin'))
 
-        await self.subscribe(self.on_sim_telemetry, 'sim.telemetry')
+        await self.subscribe(
+            self.telemetry_decoder.on_schema, TELEMETRY_SCHEMA_TOPIC, options=SubscribeOptions(get_retained=True)
+        )
+        await self.subscribe(self.on_sim_telemetry, TELEMETRY_TOPIC)
 
         self.is_running = True
 
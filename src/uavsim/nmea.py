@@ -0,0 +1,297 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+NMEA_LINE_END = b'\n'
+METERS_PER_FOOT = 0.3048
+KMH_PER_KT = 1.852
+
+# sentences in scheduling priority order, with their default rates in Hz
+NMEA_SENTENCES = ('EXINJ', 'GGA', 'RMC', 'VTG', 'HDT')
+NMEA_RATES = {
+    'EXINJ': 50.0,
+    'GGA': 5.0,
+    'RMC': 5.0,
+    'VTG': 5.0,
+    'HDT': 10.0,
+}
+NMEA_BAUD = 115200
+# bits on the wire per byte with 8N1 framing
+NMEA_BITS_PER_BYTE = 10
+# share of the link the scheduler may use, the rest is headroom for commands and jitter
+NMEA_LINK_BUDGET = 0.9
+# how long unused bandwidth can be saved up for, s
+NMEA_BURST = 0.1
+NMEA_MAX_LENGTH = 82
+
+
+def nmea_checksum(payload):
+    """
+    XOR of all payload bytes (between '$' and '*'), folded as one integer instead of byte by byte.
+    """
+    value = int.from_bytes(payload, 'little')
+    size = len(payload)
+
+    while size > 1:
+        half = (size + 1) // 2
+        value = (value >> (8 * half)) ^ (value & ((1 << (8 * half)) - 1))
+        size = half
+
+    return value
+
+
+def nmea_sentence(payload):
+    """
+    Frames a payload as a checksummed sentence, e.g. b'GPGGA,...' -> b'$GPGGA,...*5C\\n'.
+    """
+    return b'$%s*%02X%s' % (payload, nmea_checksum(payload), NMEA_LINE_END)
+
+
+def parse_rates(values):
+    """
+    Sentence rate table from 'SENTENCE=HZ' strings on top of the defaults, a rate of 0 disables a sentence.
+    """
+    rates = dict(NMEA_RATES)
+
+    for value in values or ():
+        name, _, rate = value.partition('=')
+        name = name.strip().upper()
+
+        if name not in NMEA_RATES:
+            raise ValueError('Unknown NMEA sentence: {}'.format(name))
+
+        rates[name] = float(rate)
+
+    return rates
+
+
+def _hemisphere(value, positive, negative):
+    return (value * 100, positive) if value > 0 else (value * -100, negative)
+
+
+class NMEAEncoder(object):
+    """
+    Encodes a telemetry sample into the selected sentences as one buffer, ready for a single write. The size of every
+    sentence of the last sample is kept in `sizes` and its position in the buffer in `offsets`.
+
+    Sentences are formatted into a reused bytearray and the time and date fields are only formatted again when the
+    second changes. Coordinates keep the encoding the UAV firmware expects (degrees * 100).
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._second = None
+        self._time = b''
+        self._date = b''
+        self.sizes = {}
+        self.offsets = {}
+
+    def _clock(self, timestamp):
+        second = int(timestamp)
+
+        if second != self._second:
+            dt = time.gmtime(second)
+            self._second = second
+            self._time = time.strftime('%H%M%S', dt).encode('ascii')
+            self._date = time.strftime('%d%m%y', dt).encode('ascii')
+
+    def _checksum(self, start):
+        """
+        Terminates the sentence that starts at `start` in the buffer with its checksum.
+        """
+        buffer = self._buffer
+
+        with memoryview(buffer) as view:
+            checksum = nmea_checksum(view[start + 1:])
+
+        buffer += b'*%02X%s' % (checksum, NMEA_LINE_END)
+
+    def gga(self, lat, lat_half, lon, lon_half, alt):
+        start = len(self._buffer)
+        self._buffer += b'$GPGGA,%s.000,%09.4f,%s,%010.4f,%s,1,7,1.15,%.2f,M,23.7,M,,' % (
+            self._time, lat, lat_half, lon, lon_half, alt
+        )
+        self._checksum(start)
+
+    def rmc(self, lat, lat_half, lon, lon_half, speed, course):
+        start = len(self._buffer)
+        self._buffer += b'$GPRMC,%s.000,A,%09.4f,%s,%010.4f,%s,%.2f,%.2f,%s,,,A' % (
+            self._time, lat, lat_half, lon, lon_half, speed, course, self._date
+        )
+        self._checksum(start)
+
+    def vtg(self, course, speed):
+        start = len(self._buffer)
+        self._buffer += b'$GPVTG,%.2f,T,,M,%.2f,N,%.2f,K,A' % (course, speed, speed * KMH_PER_KT)
+        self._checksum(start)
+
+    def hdt(self, heading):
+        start = len(self._buffer)
+        self._buffer += b'$GPHDT,%.2f,T' % heading
+        self._checksum(start)
+
+    def exinj(self, heading, roll, pitch, yaw):
+        # the UAV parses EXINJ without a checksum
+        self._buffer += b'$EXINJ,%.4f,%.4f,%.4f,%.4f,NA%s' % (heading, roll, pitch, yaw, NMEA_LINE_END)
+
+    def encode(self, telemetry, sentences=NMEA_SENTENCES):
+        """
+        Returns the given sentences of a telemetry sample as one bytes object, timestamped with the sample's dt.
+        """
+        dt = telemetry.get('dt')
+        self._clock(time.time() if dt is None else dt)
+        buffer = self._buffer
+        del buffer[:]
+        self.sizes = sizes = {}
+        self.offsets = offsets = {}
+
+        lat, lat_half = _hemisphere(telemetry['latitude-deg'], b'N', b'S')
+        lon, lon_half = _hemisphere(telemetry['longitude-deg'], b'E', b'W')
+        heading = telemetry['heading-deg']
+        speed = telemetry['groundspeed-kt']
+
+        for sentence in sentences:
+            start = len(buffer)
+
+            if sentence == 'GGA':
+                self.gga(lat, lat_half, lon, lon_half, telemetry['altitude-ft'] * METERS_PER_FOOT)
+            elif sentence == 'RMC':
+                self.rmc(lat, lat_half, lon, lon_half, speed, heading)
+            elif sentence == 'VTG':
+                self.vtg(heading, speed)
+            elif sentence == 'HDT':
+                self.hdt(heading)
+            elif sentence == 'EXINJ':
+                # yaw-deg is '' in FlightGear, the heading stands in for it
+                self.exinj(heading, telemetry['roll-deg'], telemetry['pitch-deg'], heading)
+
+            sizes[sentence] = len(buffer) - start
+            offsets[sentence] = (start, len(buffer))
+
+        return bytes(buffer)
+
+    def select(self, data, sentences):
+        """
+        The given sentences, a subset of the last encoded ones, cut out of the last output `data`.
+        """
+        if len(sentences) == len(self.offsets):
+            return data
+
+        return b''.join([data[start:end] for start, end in map(self.offsets.__getitem__, sentences)])
+
+
+class NMEAScheduler(object):
+    """
+    Decides which sentences go out with a telemetry sample, from a per-sentence rate table and the link bandwidth.
+
+    Every sentence is due once per 1 / rate seconds. Due sentences are taken oldest deadline first (ties in
+    NMEA_SENTENCES order) while they fit a token bucket filled at NMEA_LINK_BUDGET of the baud rate, so the UART is
+    never asked for more than it can carry. A sentence that doesn't fit stays due and goes out with a later sample.
+    """
+
+    def __init__(self, baud=NMEA_BAUD, rates=None, budget=NMEA_LINK_BUDGET, burst=NMEA_BURST, name=''):
+        self.name = name
+        self.baud = baud
+        self.rates = NMEA_RATES if rates is None else rates
+        self.capacity = baud / NMEA_BITS_PER_BYTE
+        self.fill_rate = self.capacity * budget
+        self.burst = max(self.fill_rate * burst, 2 * NMEA_MAX_LENGTH)
+        self.sentences = tuple(s for s in NMEA_SENTENCES if self.rates.get(s, 0) > 0)
+        self.periods = {s: 1.0 / self.rates[s] for s in self.sentences}
+        self.next_due = {s: 0.0 for s in self.sentences}
+        # size estimates until the sentence has been encoded once
+        self.sizes = {s: NMEA_MAX_LENGTH for s in self.sentences}
+        self.tokens = self.burst
+        self.last = None
+
+        self.counts = dict.fromkeys(self.sentences, 0)
+        self.deferred = 0
+        self.bytes = 0
+        self.reported = None
+        self._last_stats = {}
+
+        rate = sum(self.rates[s] * NMEA_MAX_LENGTH for s in self.sentences)
+
+        if rate > self.fill_rate:
+            logger.warning('NMEA rates need up to {:.0f} B/s, {} baud carries {:.0f} B/s, sentences will be deferred'
+                           .format(rate, baud, self.fill_rate))
+
+    def due(self, now):
+        """
+        Sentences to send with a sample at `now` (loop time, s).
+        """
+        if self.last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.fill_rate)
+
+        self.last = now
+
+        if self.reported is None:
+            self.reported = now
+
+        tokens = self.tokens
+        sentences = []
+
+        # most overdue first, so a saturated link shares its bandwidth instead of starving the slow sentences
+        for sentence in sorted(self.sentences, key=self.next_due.get):
+            due = self.next_due[sentence]
+
+            if now < due:
+                break
+
+            size = self.sizes[sentence]
+
+            if size > tokens:
+                # saves the bandwidth up for it rather than letting smaller, later sentences take it
+                self.deferred += 1
+                break
+
+            tokens -= size
+            sentences.append(sentence)
+            due += self.periods[sentence]
+            # a sentence late by more than a period restarts its cadence instead of catching up in a burst
+            self.next_due[sentence] = due if due > now else now + self.periods[sentence]
+
+        return sentences
+
+    def sent(self, sentences, sizes):
+        """
+        Accounts for sentences written to the link, with their actual encoded sizes.
+        """
+        for sentence in sentences:
+            size = sizes[sentence]
+            self.sizes[sentence] = size
+            self.counts[sentence] += 1
+            self.tokens -= size
+            self.bytes += size
+
+    def stats(self):
+        """
+        Link statistics of the last completed report interval.
+        """
+        return self._last_stats
+
+    def report(self, now):
+        elapsed = now - self.reported if self.reported is not None else 0.0
+
+        if elapsed <= 0:
+            return
+
+        self._last_stats = {
+            'baud': self.baud,
+            'bytes-per-s': self.bytes / elapsed,
+            'utilisation': self.bytes / (self.capacity * elapsed),
+            'deferred': self.deferred,
+            'rates': {sentence: count / elapsed for sentence, count in self.counts.items()},
+        }
+        self.reported = now
+        self.bytes = 0
+        self.deferred = 0
+        self.counts = dict.fromkeys(self.sentences, 0)
+
+        stats = self._last_stats
+        logger.info('NMEA link {}{:.0f} B/s, {:.1%} of {} baud, {} deferred, {}'.format(
+            self.name + ': ' if self.name else '', stats['bytes-per-s'], stats['utilisation'], self.baud,
+            stats['deferred'], ', '.join('{} {:.1f} Hz'.format(s, r) for s, r in stats['rates'].items())
+        ))
@@ -0,0 +1,574 @@
+import datetime
+import json
+import logging
+import os
+import time
+
+import h5py
+import numpy as np
+
+from uavsim.decimation import reduce_envelope
+from uavsim.telemetry import TELEMETRY_STRING_SIZE, TELEMETRY_TIMESTAMP, TelemetryRecord, TelemetrySchema
+
+logger = logging.getLogger(__name__)
+
+
+RECORDING_GROUP = 'telemetry'
+# compound dataset, one field per telemetry value
+RECORDING_VALUES = 'block0_values'
+# names of the recorded telemetry fields
+RECORDING_ITEMS = 'block0_items'
+# number of valid rows, the values dataset is grown ahead of it
+RECORDING_LENGTH = 'nrows'
+RECORDING_CHUNK_BYTES = 64 * 1024
+RECORDING_FLUSH_ROWS = 1000
+RECORDING_FLUSH_INTERVAL = 1000
+# min/max envelopes of the numeric fields, one dataset per decimation level
+RECORDING_LOD = 'lod'
+RECORDING_LOD_FACTOR = 8
+RECORDING_LOD_LEVELS = 8
+RECORDING_LOD_TYPES = (float, int)
+# rows read from disk at once when replaying
+RECORDING_READ_ROWS = 4096
+RECORDING_PREFIX = 'swmr_telemetry'
+RECORDING_PARTITION = '{}-{:05d}.h5'
+RECORDING_INDEX = '{}.index.json'
+# seconds of telemetry per partition
+RECORDING_ROLLOVER_INTERVAL = 3600
+# partition file size in bytes, 0 disables size based rollover
+RECORDING_ROLLOVER_SIZE = 0
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_LZF = 'lzf'
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_LZF)
+COMPRESSION_LEVEL = 4
+
+RECORDING_DTYPES = {float: '<f8', int: '<i8', bool: '?', str: 'S{}'.format(TELEMETRY_STRING_SIZE)}
+# missing values can't be stored in a compound row, floats become nan and the rest their zero value
+RECORDING_DEFAULTS = {float: np.nan, int: 0, bool: False, str: b''}
+RECORDING_KINDS = {'f': float, 'i': int, 'b': bool, 'S': str}
+
+
+def schema_dtype(schema):
+    return np.dtype([(name, RECORDING_DTYPES[t]) for name, t in schema.fields])
+
+
+def chunk_rows(dtype, chunk_bytes=RECORDING_CHUNK_BYTES):
+    """
+    Largest power of two number of rows fitting into chunk_bytes.
+    """
+    rows = max(1, chunk_bytes // dtype.itemsize)
+
+    return 1 << (rows.bit_length() - 1)
+
+
+def compression_options(compression, level=COMPRESSION_LEVEL):
+    if compression == COMPRESSION_GZIP:
+        return {'compression': 'gzip', 'compression_opts': level, 'shuffle': True}
+
+    if compression == COMPRESSION_LZF:
+        return {'compression': 'lzf', 'shuffle': True}
+
+    return {}
+
+
+def recording_length(group):
+    """
+    Number of valid rows in a recording group, for SWMR readers the datasets should be refreshed first.
+    """
+    if RECORDING_LENGTH in group:
+        return int(group[RECORDING_LENGTH][0])
+
+    return len(group[RECORDING_VALUES])
+
+
+def recording_schema(values):
+    """
+    TelemetrySchema of a recorded compound values dataset.
+    """
+    return TelemetrySchema((name, RECORDING_KINDS[values.dtype[name].kind]) for name in values.dtype.names)
+
+
+def recording_columns(rows, names):
+    """
+    Selected fields of compound rows as an (n, len(names)) float64 array.
+    """
+    return np.stack([rows[name] for name in names], axis=-1).astype('float64')
+
+
+def recording_lod(group):
+    """
+    The level of detail pyramid of a recording group, None for recordings made without one.
+    """
+    if RECORDING_LOD in group:
+        return TelemetryPyramid(group[RECORDING_LOD])
+
+    return None
+
+
+def recording_items(group):
+    return [item.decode('utf-8') if isinstance(item, bytes) else item for item in group[RECORDING_ITEMS][:]]
+
+
+class TelemetryWriter(object):
+    """
+    Appends telemetry to an HDF5 file which can be read live in SWMR mode.
+
+    Every telemetry field is stored in one compound dataset, laid out after the schema of the first sample, next to a
+    TelemetryPyramid of the numeric fields. Samples are collected in an in-memory block and written with a single
+    dataset write once `flush_rows` rows are buffered or the oldest buffered row is `flush_interval` ms old. The values
+    dataset grows geometrically, readers learn how many rows are valid from the separate length dataset, which is only
+    updated after the rows are flushed.
+    """
+
+    def __init__(self, path, flush_rows=RECORDING_FLUSH_ROWS, flush_interval=RECORDING_FLUSH_INTERVAL,
+                 compression=COMPRESSION_GZIP, compression_level=COMPRESSION_LEVEL):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval / 1000
+        self.compression = compression
+        self.compression_level = compression_level
+        self.file = None
+        self.schema = None
+        self.values = None
+        self.length_dataset = None
+        self.length = 0
+        self.lod = None
+
+        self._buffer = None
+        self._buffered = 0
+        self._buffered_since = None
+        self._defaults = ()
+
+    def _open_file(self, dtype):
+        self.file = h5py.File(self.path, 'a', libver='latest')
+
+        if RECORDING_GROUP not in self.file:
+            return
+
+        values = self.file[RECORDING_GROUP].get(RECORDING_VALUES)
+
+        if values is None or values.dtype != dtype:
+            self.file.close()
+            moved_path = '{}.{:%Y%m%d%H%M%S}'.format(self.path, datetime.datetime.now())
+            logger.warning('{} holds another telemetry layout, moving it to {}'.format(self.path, moved_path))
+            os.rename(self.path, moved_path)
+            self.file = h5py.File(self.path, 'a', libver='latest')
+
+    def _open(self, schema):
+        """
+        Opens the file for a schema, the datasets are created unless the file already holds a recording of that layout.
+        """
+        dtype = schema_dtype(schema)
+        self._open_file(dtype)
+
+        if RECORDING_GROUP in self.file:
+            group = self.file[RECORDING_GROUP]
+        else:
+            group = self.file.create_group(RECORDING_GROUP)
+            group.create_dataset(RECORDING_ITEMS, data=np.array([name.encode('utf-8') for name in schema.names]))
+            group.create_dataset(
+                RECORDING_VALUES, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(chunk_rows(dtype),),
+                **compression_options(self.compression, self.compression_level)
+            )
+            group.create_dataset(RECORDING_LENGTH, data=np.array([0], dtype='int64'))
+
+        self.schema = schema
+        self.values = group[RECORDING_VALUES]
+        self.length_dataset = group[RECORDING_LENGTH]
+        self.length = int(self.length_dataset[0])
+
+        if RECORDING_LOD in group:
+            self.lod = TelemetryPyramid(group[RECORDING_LOD])
+        else:
+            self.lod = TelemetryPyramid.create(
+                group, [name for name, t in schema.fields if t in RECORDING_LOD_TYPES],
+                **compression_options(self.compression, self.compression_level)
+            )
+
+        self.lod.resume(self.values, self.length)
+        # every dataset has to exist before switching to SWMR
+        self.file.swmr_mode = True
+
+        self._buffer = np.zeros(self.flush_rows, dtype=dtype)
+        self._defaults = tuple(RECORDING_DEFAULTS[t] for t in schema.types)
+
+    def _start_block(self):
+        if not self._buffered:
+            self._buffered_since = time.monotonic()
+
+    def append_record(self, telemetry):
+        """
+        Buffers one sample, a TelemetryRecord or a telemetry dict. Fields unknown to the recorded schema are dropped.
+        """
+        if self.schema is None:
+            self._open(TelemetrySchema.from_mapping(telemetry))
+
+        self._start_block()
+        values = self.schema.values_of(telemetry)
+
+        if None in values:
+            values = [default if value is None else value for value, default in zip(values, self._defaults)]
+
+        self._buffer[self._buffered] = tuple(values)
+        self._buffered += 1
+
+        if self._buffered == self.flush_rows:
+            self.flush()
+
+    def append_frame(self, frame):
+        """
+        Buffers every sample of a TelemetryFrame, column by column.
+        """
+        if self.schema is None:
+            self._open(frame.schema)
+
+        count = len(frame)
+        offset = 0
+
+        while offset < count:
+            self._start_block()
+            rows = min(count - offset, self.flush_rows - self._buffered)
+            block = self._buffer[self._buffered:self._buffered + rows]
+
+            for name, default in zip(self.schema.names, self._defaults):
+                if name not in frame.schema.index:
+                    block[name] = default
+                    continue
+
+                column = frame.column(name)[offset:offset + rows]
+
+                if None in column:
+                    column = [default if value is None else value for value in column]
+
+                block[name] = column
+
+            self._buffered += rows
+            offset += rows
+
+            if self._buffered == self.flush_rows:
+                self.flush()
+
+    def due(self, now):
+        return bool(self._buffered) and now - self._buffered_since >= self.flush_interval
+
+    def flush(self):
+        if not self._buffered:
+            return
+
+        length = self.length + self._buffered
+
+        if length > len(self.values):
+            self.values.resize((max(length, 2 * len(self.values), self.values.chunks[0]),))
+
+        self.values[self.length:length] = self._buffer[:self._buffered]
+        self.values.flush()
+        self.lod.extend(self._buffer[:self._buffered])
+
+        self.length = length
+        self.length_dataset[0] = length
+        self.length_dataset.flush()
+
+        self._buffered = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+class TelemetryPyramid(object):
+    """
+    Min/max envelopes of the numeric telemetry fields at power-of-`factor` decimations.
+
+    Level l holds one (min, max) pair per factor ** l samples in an (M, 2, F) dataset, so a plot of any range reads
+    about as many points as it displays. Levels are extended incrementally on every flush: complete buckets are
+    written once, while the last, still filling bucket of each level is rewritten until it completes. The pending
+    inputs of the incomplete buckets (less than `factor` entries per level) are kept in memory.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self.factor = int(group.attrs['factor'])
+        self.items = recording_items(group)
+        self.index = {name: i for i, name in enumerate(self.items)}
+        self.levels = [group[str(level)] for level in range(1, int(group.attrs['levels']) + 1)]
+        self.length_dataset = group[RECORDING_LENGTH]
+
+        self._complete = [0] * len(self.levels)
+        self._pending = [np.empty((0, 2, len(self.items))) for _ in self.levels]
+
+    @classmethod
+    def create(cls, parent, names, factor=RECORDING_LOD_FACTOR, levels=RECORDING_LOD_LEVELS, **options):
+        group = parent.create_group(RECORDING_LOD)
+        group.attrs['factor'] = factor
+        group.attrs['levels'] = levels
+        group.create_dataset(RECORDING_ITEMS, data=np.array([name.encode('utf-8') for name in names]))
+        group.create_dataset(RECORDING_LENGTH, data=np.zeros(levels, dtype='int64'))
+        rows = chunk_rows(np.dtype((np.float64, (2, len(names)))))
+
+        for level in range(1, levels + 1):
+            group.create_dataset(
+                str(level), shape=(0, 2, len(names)), maxshape=(None, 2, len(names)), dtype='float64',
+                chunks=(rows, 2, len(names)), **options
+            )
+
+        return cls(group)
+
+    def lengths(self):
+        return [int(length) for length in self.length_dataset[:]]
+
+    def envelope(self, block):
+        """
+        Turns a block of compound rows into (n, 2, F) envelope entries.
+        """
+        values = recording_columns(block, self.items)
+
+        return np.stack((values, values), axis=1)
+
+    def resume(self, values, length, block_rows=2**16):
+        """
+        Restores the pending state for a recording of `length` rows, building the levels first if they are empty.
+        """
+        if not length:
+            return
+
+        if not any(self.lengths()):
+            for offset in range(0, length, block_rows):
+                self.extend(values[offset:min(length, offset + block_rows)])
+
+            return
+
+        complete = length
+
+        for level, dataset in enumerate(self.levels):
+            below = complete
+            complete = below // self.factor
+            self._complete[level] = complete
+            start = complete * self.factor
+
+            if level:
+                self._pending[level] = self.levels[level - 1][start:below]
+            else:
+                self._pending[level] = self.envelope(values[start:below])
+
+    def extend(self, block):
+        entries = self.envelope(block)
+        partial = None
+        lengths = []
+
+        for level, dataset in enumerate(self.levels):
+            entries = np.concatenate((self._pending[level], entries))
+            count = len(entries) // self.factor
+            split = count * self.factor
+            self._pending[level] = entries[split:]
+            entries = reduce_envelope(entries[:split], self.factor) if count else entries[:0]
+
+            tail = self._pending[level]
+
+            if partial is not None:
+                tail = np.concatenate((tail, partial[np.newaxis]))
+
+            partial = reduce_envelope(tail, len(tail))[0] if len(tail) else None
+
+            start = self._complete[level]
+            self._complete[level] += count
+            length = self._complete[level] + (partial is not None)
+
+            if length > len(dataset):
+                dataset.resize(max(length, 2 * len(dataset), dataset.chunks[0]), axis=0)
+
+            if count:
+                dataset[start:start + count] = entries
+
+            if partial is not None:
+                dataset[self._complete[level]] = partial
+
+            lengths.append(length)
+
+        for dataset in self.levels:
+            dataset.flush()
+
+        self.length_dataset[:] = lengths
+        self.length_dataset.flush()
+
+
+def read_index(index_path):
+    """
+    Partitions of a recording session, in recording order.
+    """
+    with open(index_path) as f:
+        return json.load(f)['partitions']
+
+
+def select_partitions(partitions, start=None, end=None):
+    """
+    Partitions holding samples between the start and end timestamps, either bound may be omitted. Partitions without
+    a known time range are always included.
+    """
+    return [
+        partition for partition in partitions
+        if (start is None or partition['end'] is None or partition['end'] >= start)
+        and (end is None or partition['start'] is None or partition['start'] <= end)
+    ]
+
+
+def partition_paths(path, start=None, end=None):
+    """
+    Recording files to read for a path, which is either a recording file or the index of a recording session.
+    """
+    if not path.endswith('.json'):
+        return [path]
+
+    directory = os.path.dirname(path)
+
+    return [os.path.join(directory, partition['file']) for partition in select_partitions(read_index(path), start, end)]
+
+
+def read_records(path, start=None, end=None, chunk_rows=RECORDING_READ_ROWS):
+    """
+    Streams a recording from disk as lists of TelemetryRecords, one list per chunk of `chunk_rows` rows, optionally
+    limited to samples between the start and end timestamps. Stored nan floats and empty strings become None again.
+    """
+    with h5py.File(path, 'r', swmr=True) as f:
+        group = f[RECORDING_GROUP]
+        values = group[RECORDING_VALUES]
+        schema = recording_schema(values)
+        length = recording_length(group)
+        floats = [i for i, t in enumerate(schema.types) if t is float]
+        strings = [i for i, t in enumerate(schema.types) if t is str]
+
+        for offset in range(0, length, chunk_rows):
+            chunk = values[offset:min(length, offset + chunk_rows)]
+
+            if start is not None or end is not None:
+                timestamps = chunk[TELEMETRY_TIMESTAMP]
+                chunk = chunk[(timestamps >= (-np.inf if start is None else start)) &
+                              (timestamps <= (np.inf if end is None else end))]
+
+            rows = [list(row) for row in chunk.tolist()]
+
+            for i in floats:
+                for row in np.flatnonzero(np.isnan(chunk[schema.names[i]])):
+                    rows[row][i] = None
+
+            for i in strings:
+                for row in rows:
+                    row[i] = row[i].decode('utf-8') or None
+
+            if rows:
+                yield [TelemetryRecord(schema, row) for row in rows]
+
+
+class RecordingSession(object):
+    """
+    Records telemetry into a series of partition files, rolling over to a new one once the current partition spans
+    `rollover_interval` seconds of telemetry or its file grows past `rollover_size` bytes.
+
+    An index file next to the partitions lists each of them with its time range and row count, so readers can open
+    only the partitions covering the time window they need. Rollover happens between two appends: the current
+    partition is flushed and closed before the sample that triggered it is written to the next one.
+    """
+
+    def __init__(self, directory, prefix=RECORDING_PREFIX, rollover_interval=RECORDING_ROLLOVER_INTERVAL,
+                 rollover_size=RECORDING_ROLLOVER_SIZE, **writer_options):
+        self.directory = directory
+        self.prefix = prefix
+        self.rollover_interval = rollover_interval
+        self.rollover_size = rollover_size
+        self.writer_options = writer_options
+        self.index_path = os.path.join(directory, RECORDING_INDEX.format(prefix))
+        self.partitions = read_index(self.index_path) if os.path.exists(self.index_path) else []
+        self.partition = None
+        self.writer = None
+
+        self._checked_length = 0
+
+    def _rollover_due(self, dt):
+        started = self.partition['start']
+
+        if self.rollover_interval and dt is not None and started is not None and dt - started >= self.rollover_interval:
+            return True
+
+        if self.rollover_size and self.writer.length != self._checked_length:
+            # the file only grows on flushes, so its size is checked once per flush
+            self._checked_length = self.writer.length
+
+            return os.path.getsize(self.writer.path) >= self.rollover_size
+
+        return False
+
+    def _open_partition(self, dt):
+        name = RECORDING_PARTITION.format(self.prefix, len(self.partitions))
+        logger.info('Recording partition {}'.format(name))
+
+        self.partition = {'file': name, 'start': dt, 'end': dt, 'rows': 0}
+        self.partitions.append(self.partition)
+        self.writer = TelemetryWriter(os.path.join(self.directory, name), **self.writer_options)
+        self._checked_length = 0
+        self.write_index()
+
+    def _close_partition(self):
+        self.writer.close()
+        self.partition['rows'] = self.writer.length
+        self.writer = None
+        self.write_index()
+
+    def _reserve(self, dt):
+        if self.writer is not None and self._rollover_due(dt):
+            self._close_partition()
+
+        if self.writer is None:
+            self._open_partition(dt)
+
+    def _extend(self, start, end):
+        if start is not None and (self.partition['start'] is None or start < self.partition['start']):
+            self.partition['start'] = start
+
+        if end is not None and (self.partition['end'] is None or end > self.partition['end']):
+            self.partition['end'] = end
+
+    def append_record(self, telemetry):
+        dt = telemetry.get(TELEMETRY_TIMESTAMP)
+        self._reserve(dt)
+        self.writer.append_record(telemetry)
+        self._extend(dt, dt)
+
+    def append_frame(self, frame):
+        if not len(frame):
+            return
+
+        timestamps = [dt for dt in frame.column(TELEMETRY_TIMESTAMP) if dt is not None]
+        self._reserve(timestamps[0] if timestamps else None)
+        self.writer.append_frame(frame)
+
+        if timestamps:
+            self._extend(min(timestamps), max(timestamps))
+
+    def write_index(self):
+        """
+        Replaces the index atomically, readers never see a partially written one.
+        """
+        temp_path = self.index_path + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            json.dump({'partitions': self.partitions}, f, indent=2)
+
+        os.replace(temp_path, self.index_path)
+
+    def due(self, now):
+        return self.writer is not None and self.writer.due(now)
+
+    def flush(self):
+        if self.writer is None:
+            return
+
+        self.writer.flush()
+        self.partition['rows'] = self.writer.length
+        self.write_index()
+
+    def close(self):
+        if self.writer is not None:
+            self._close_partition()
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from autobahn import wamp
+from autobahn.wamp.types import RegisterOptions
+from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
+
+from uavsim.recording import RECORDING_READ_ROWS, partition_paths, read_records
+from uavsim.telemetry import (TELEMETRY_BATCH_INTERVAL, TELEMETRY_BATCH_SIZE, TELEMETRY_BATCH_TOPIC,
+                              TELEMETRY_SCHEMA_TOPIC, TELEMETRY_TIMESTAMP, WIRE_FORMAT_JSON, WIRE_FORMATS,
+                              TelemetryPublisher)
+from uavsim.tracing import Tracer, strip_trace
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CROSSBAR_ROUTE = 'ws://127.0.0.1:8091/uavsim'
+REPLAY_REPORT_INTERVAL = 5.0
+
+
+class ReplayComponent(TelemetryPublisher, ApplicationSession):
+    """
+    Republishes a recording made by StatisticsComponent on sim.telemetry, paced by the recorded timestamps.
+
+    At `speed` 1 samples are published in real time, at N N times faster and at 0 as fast as possible. Samples are
+    scheduled against the replay start, so a late publish is caught up on and doesn't delay the following ones.
+    """
+
+    def __init__(self, config=None):
+        ApplicationSession.__init__(self, config)
+        self.path = self.config.extra['path']
+        self.speed = self.config.extra.get('speed', 1.0)
+        self.start = self.config.extra.get('start')
+        self.end = self.config.extra.get('end')
+        self.repeat = self.config.extra.get('repeat', False)
+        self.chunk_rows = self.config.extra.get('chunk_rows', RECORDING_READ_ROWS)
+        self.tracer = Tracer()
+        self.is_running: bool = False
+        self.init_telemetry_publisher()
+
+        self.published = 0
+        self.lag = 0.0
+        self._stats = {}
+
+    @wamp.register('replay.stats')
+    def get_replay_stats(self):
+        return self._stats
+
+    def publish_telemetry(self, telemetry):
+        # replayed samples have no FlightGear read, their trace starts when they are published
+        TelemetryPublisher.publish_telemetry(self, self.tracer.stamp_publish(telemetry))
+        self.published += 1
+
+    async def report(self):
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        published = 0
+
+        while self.is_running:
+            await asyncio.sleep(REPLAY_REPORT_INTERVAL)
+
+            now = loop.time()
+            rate = (self.published - published) / (now - started)
+            started, published = now, self.published
+            self._stats = {'published': published, 'rate': rate, 'lag-ms': self.lag * 1000}
+
+            logger.info('Replayed {} samples, {:.1f} samples/s, {:.1f} ms behind schedule'.format(
+                published, rate, self.lag * 1000
+            ))
+
+    async def replay(self):
+        loop = asyncio.get_event_loop()
+        started = None
+        first_dt = None
+
+        for path in partition_paths(self.path, self.start, self.end):
+            logger.info('Replaying {}'.format(path))
+
+            for records in read_records(path, self.start, self.end, self.chunk_rows):
+                for record in records:
+                    if not self.is_running:
+                        return
+
+                    dt = record[TELEMETRY_TIMESTAMP]
+
+                    if self.speed and dt is not None:
+                        if started is None:
+                            started, first_dt = loop.time(), dt
+
+                        delay = started + (dt - first_dt) / self.speed - loop.time()
+
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+
+                        self.lag = max(0.0, -delay)
+
+                    # the recorded trace stamps are of the recording run, they would only skew the live hops
+                    self.publish_telemetry(strip_trace(record))
+
+                # lets other tasks run in between chunks when replaying as fast as possible
+                await asyncio.sleep(0)
+
+        if self.telemetry_batcher:
+            self.telemetry_batcher.flush()
+
+    async def onJoin(self, details):
+        await self.register(self, options=RegisterOptions(invoke='roundrobin'))
+
+        self.is_running = True
+        asyncio.ensure_future(self.report())
+
+        if self.telemetry_batcher:
+            asyncio.ensure_future(self.flush_telemetry_batches())
+
+        try:
+            while self.is_running:
+                await self.replay()
+
+                if not self.repeat:
+                    break
+        finally:
+            self.is_running = False
+
+        logger.info('Replay finished, {} samples published'.format(self.published))
+        self.leave()
+
+    async def onLeave(self, details):
+        self.is_running = False
+        self.disconnect()
+
+
+def join_to_router(component_class, options):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    runner = ApplicationRunner(
+        CROSSBAR_ROUTE,
+        'uavsim',
+        extra=options
+    )
+
+    rerun = True
+
+    while rerun:
+        rerun = False
+
+        try:
+            runner.run(component_class)
+        # except gaierror:
+        except OSError:
+            # TODO: log about [Errno -3] Temporary failure in name resolution
+            rerun = True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Telemetry replay',
+    )
+    parser.add_argument(
+        'path',
+        help='Recording file, or the index of a recording session to replay all of its partitions'
+    )
+    parser.add_argument(
+        '--speed',
+        dest='speed',
+        help='Replay speed relative to the recording, 0 replays as fast as possible',
+        type=float,
+        default=1.0
+    )
+    parser.add_argument(
+        '--start',
+        dest='start',
+        help='Replay samples recorded from this UTC timestamp on',
+        type=float,
+        default=None
+    )
+    parser.add_argument(
+        '--end',
+        dest='end',
+        help='Replay samples recorded up to this UTC timestamp',
+        type=float,
+        default=None
+    )
+    parser.add_argument(
+        '--repeat',
+        dest='repeat',
+        help='Start over once the recording is replayed',
+        action='store_true',
+        default=False
+    )
+    parser.add_argument(
+        '--chunk-rows',
+        dest='chunk_rows',
+        help='Rows read from disk at once',
+        type=int,
+        default=RECORDING_READ_ROWS
+    )
+    parser.add_argument(
+        '--wire-format',
+        dest='wire_format',
+        help='Telemetry payload format, binary payloads are decoded with the schema announced on {}'.format(
+            TELEMETRY_SCHEMA_TOPIC
+        ),
+        choices=WIRE_FORMATS,
+        default=WIRE_FORMAT_JSON
+    )
+    parser.add_argument(
+        '--batch-size',
+        dest='batch_size',
+        help='Maximum number of samples per frame published on {}, 0 disables batching'.format(TELEMETRY_BATCH_TOPIC),
+        type=int,
+        default=TELEMETRY_BATCH_SIZE
+    )
+    parser.add_argument(
+        '--batch-interval',
+        dest='batch_interval',
+        help='Maximum time span of a frame published on {}, ms'.format(TELEMETRY_BATCH_TOPIC),
+        type=int,
+        default=TELEMETRY_BATCH_INTERVAL
+    )
+
+    args = parser.parse_args(sys.argv[1:])
+
+    join_to_router(ReplayComponent, {
+        'path': args.path,
+        'speed': args.speed,
+        'start': args.start,
+        'end': args.end,
+        'repeat': args.repeat,
+        'chunk_rows': args.chunk_rows,
+        'wire_format': args.wire_format,
+        'batch_size': args.batch_size,
+        'batch_interval': args.batch_interval,
+    })
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+SCHEDULER_REPORT_INTERVAL = 10.0
+
+
+class RateGroup(object):
+    """
+    A coroutine function called at a fixed rate, with deadline statistics since the last report.
+    """
+
+    def __init__(self, name, rate, callback):
+        if rate <= 0:
+            raise ValueError('Rate of {} must be positive, got {}'.format(name, rate))
+
+        self.name = name
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.callback = callback
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.samples = 0
+        self.missed = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+
+    def record(self, jitter):
+        self.samples += 1
+        self.jitter_sum += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+
+    def stats(self, interval):
+        return {
+            'rate': self.rate,
+            'achieved-rate': self.samples / interval if interval else 0.0,
+            'samples': self.samples,
+            'missed': self.missed,
+            'jitter-mean-ms': self.jitter_sum / self.samples * 1000 if self.samples else 0.0,
+            'jitter-max-ms': self.jitter_max * 1000,
+        }
+
+
+class RateScheduler(object):
+    """
+    Runs every group against absolute deadlines (start + n * period), so read latency doesn't accumulate into drift.
+
+    A call that starts late is run at once and recorded as jitter; when a call overruns whole periods, those are
+    counted as missed and skipped instead of being caught up in a burst.
+    """
+
+    def __init__(self, report_interval=SCHEDULER_REPORT_INTERVAL):
+        self.groups = []
+        self.report_interval = report_interval
+        self.is_running = False
+        self._report_started = None
+        self._last_stats = {}
+
+    def add(self, name, rate, callback):
+        group = RateGroup(name, rate, callback)
+        self.groups.append(group)
+
+        return group
+
+    async def _run_group(self, loop, group, start):
+        deadline = start
+
+        while self.is_running:
+            # a late call still yields once, so a group that can't keep up doesn't starve the others
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+            group.record(max(0.0, loop.time() - deadline))
+            await group.callback()
+
+            deadline += group.period
+            lag = loop.time() - deadline
+
+            if lag >= group.period:
+                # only deadlines that passed entirely are skipped, a call late by less runs at once
+                skipped = int(lag // group.period)
+                group.missed += skipped
+                deadline += skipped * group.period
+
+    def stats(self):
+        """
+        Statistics of the last completed report interval, per group name.
+        """
+        return self._last_stats
+
+    def report(self, loop):
+        interval = loop.time() - self._report_started
+        self._report_started = loop.time()
+        self._last_stats = {group.name: group.stats(interval) for group in self.groups}
+
+        for group in self.groups:
+            stats = self._last_stats[group.name]
+            logger.info(
+                '{}: {:.1f}/{:.1f} Hz, {} missed, jitter mean {:.2f} ms, max {:.2f} ms'.format(
+                    group.name, stats['achieved-rate'], stats['rate'], stats['missed'],
+                    stats['jitter-mean-ms'], stats['jitter-max-ms']
+                )
+            )
+            group.reset_stats()
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        self._report_started = start
+        self.is_running = True
+
+        tasks = [asyncio.ensure_future(self._run_group(loop, group, start)) for group in self.groups]
+
+        try:
+            while self.is_running:
+                await asyncio.sleep(self.report_interval)
+
+                if not self.is_running:
+                    break
+
+                self.report(loop)
+
+                for task in tasks:
+                    if task.done():
+                        # surfaces exceptions of a failed group
+                        task.result()
+        finally:
+            self.is_running = False
+
+            for task in tasks:
+                task.cancel()
+
+    def stop(self):
+        self.is_running = False
@@ -1,38 +1,307 @@
-import serial
+import asyncio
+import collections
+import os
 import select
 
+import serial
+
+SERIAL_BAUD = 115200
+# inbound buffer, also the longest line that can be framed
+SERIAL_READ_BUFFER = 2 ** 14
+# outbound bytes queued per port before writes are dropped, about 0.5 s at 115200 baud
+SERIAL_WRITE_BUFFER = 2 ** 13
+SERIAL_LINE_END = b'\n'
+
 
 class SerialPort(object):
     """"
-    Implements a PySerial port.
+    Implements a non-blocking PySerial port.
+
+    Reads go in bulk into one reusable buffer and lines are handed out as memoryviews into it, so reading does not
+    cost a Python call or a copy per byte. Writes are queued and coalesced into as few write calls as the port allows.
     """
 
-    def __init__(self, port, baud=115200):
+    def __init__(self, port, baud=SERIAL_BAUD, max_buffer=SERIAL_WRITE_BUFFER, read_buffer=SERIAL_READ_BUFFER):
         self.serial_port = serial.Serial(port=port,
                                          baudrate=baud,
-                                         timeout=0.1,
+                                         timeout=0,
+                                         write_timeout=0,
                                          bytesize=serial.EIGHTBITS,
                                          parity=serial.PARITY_NONE,
                                          stopbits=serial.STOPBITS_ONE,
                                          xonxoff=False,
                                          rtscts=False,
                                          dsrdtr=False)
+        self.fd = self.serial_port.fileno()
+        self.max_buffer = max_buffer
+
+        self._buffer = bytearray(read_buffer)
+        self._view = memoryview(self._buffer)
+        # unconsumed inbound data is _buffer[_start:_end]
+        self._start = 0
+        self._end = 0
+        # set after a line overflowed the buffer, until its line ending was skipped
+        self._discarding = False
+        self._poll = select.poll()
+        self._poll.register(self.fd, select.POLLIN)
+
+        self._queue = collections.deque()
+        self._queued = 0
+
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.frames_read = 0
+        self.frames_written = 0
+        self.writes = 0
+        self.dropped_bytes = 0
+        self.dropped_frames = 0
+
+    def fileno(self):
+        return self.fd
+
+    @property
+    def pending(self):
+        """
+        Queued outbound bytes.
+        """
+        return self._queued
+
+    def read_available(self):
+        """
+        Reads whatever the port has into the buffer with one call, returns the number of bytes read.
+
+        Raises EOFError when the port is gone.
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer):
+            if self._start == 0:
+                # a full buffer without a line ending is noise rather than a line, dropped up to its line ending
+                self.dropped_frames += 1
+                self._end = 0
+                self._discarding = True
+            else:
+                count = self._end - self._start
+                self._buffer[:count] = self._view[self._start:self._end]
+                self._start, self._end = 0, count
+
+        try:
+            count = os.readv(self.fd, (self._view[self._end:],))
+        except BlockingIOError:
+            return 0
+
+        if not count:
+            # the port is opened with VMIN=0/VTIME=0, so an empty read is an idle port unless it hung up
+            if self.hung_up():
+                raise EOFError('Serial port closed')
+
+            return 0
+
+        self._end += count
+        self.bytes_read += count
+
+        return count
+
+    def hung_up(self):
+        return any(events & (select.POLLHUP | select.POLLERR) for _, events in self._poll.poll(0))
+
+    def lines(self):
+        """
+        Complete buffered lines without their line endings, as memoryviews that are only valid until the next read.
+        """
+        buffer = self._buffer
+        view = self._view
+        end = self._end
+
+        while True:
+            start = self._start
+            position = buffer.find(SERIAL_LINE_END, start, end)
+
+            if position < 0:
+                if self._discarding:
+                    self._start = end
+
+                return
+
+            self._start = position + 1
+
+            if self._discarding:
+                # the tail of an overflowed line
+                self._discarding = False
+                continue
+
+            self.frames_read += 1
+
+            if position > start and buffer[position - 1] == 13:
+                position -= 1
+
+            yield view[start:position]
+
+    def read_lines(self):
+        self.read_available()
+
+        return self.lines()
 
     def is_byte_available(self):
-        readable, _, _ = select.select([self.serial_port.fileno()], [], [], 0)
-        return bool(readable)
+        return self._start < self._end or self.read_available() > 0
 
     def read_byte(self):
         """"
-        Reads a byte from the serial port.
+        Reads a byte from the serial port, None when there is none.
         """
         if self.is_byte_available():
-            data = self.serial_port.read()
-            if data:
-                return data[0]
+            self._start += 1
+
+            return self._buffer[self._start - 1]
 
     def write(self, data):
         """"
-        Write data to a serial port.
+        Queues data for the serial port, returns False when it was dropped because the queue is full.
         """
-        self.serial_port.write(data)
+        if self._queued + len(data) > self.max_buffer:
+            self.dropped_bytes += len(data)
+            self.dropped_frames += 1
+
+            return False
+
+        self._queue.append(data)
+        self._queued += len(data)
+        self.frames_written += 1
+
+        return True
+
+    def flush(self):
+        """
+        Writes as much of the queue as the port takes with one call, returns True when the queue is empty.
+        """
+        queue = self._queue
+
+        if not queue:
+            return True
+
+        data = queue[0] if len(queue) == 1 else b''.join(queue)
+
+        try:
+            written = os.write(self.fd, data)
+        except BlockingIOError:
+            written = 0
+
+        self.writes += 1
+        self.bytes_written += written
+        self._queued -= written
+        queue.clear()
+
+        if written < len(data):
+            queue.append(data[written:])
+
+        return not queue
+
+    def stats(self):
+        return {
+            'bytes-read': self.bytes_read,
+            'bytes-written': self.bytes_written,
+            'frames-read': self.frames_read,
+            'frames-written': self.frames_written,
+            'writes': self.writes,
+            'dropped-bytes': self.dropped_bytes,
+            'dropped-frames': self.dropped_frames,
+            'pending': self._queued,
+        }
+
+    def close(self):
+        self._view.release()
+        self.serial_port.close()
+
+
+class SerialTransport(object):
+    """
+    SerialPort driven by the event loop instead of polling.
+
+    Inbound data is read as soon as the port is readable and every complete line is passed to `on_line` as a
+    memoryview without its line ending, valid during the call only. Writes never block: they are queued, up to
+    `max_buffer` bytes, and everything written during one loop iteration goes out with one write call once the port
+    is writable. Read and write failures, a removed device included, are passed to `on_error` after the transport
+    closed itself.
+    """
+
+    def __init__(self, port, baud=SERIAL_BAUD, on_line=None, on_error=None, max_buffer=SERIAL_WRITE_BUFFER,
+                 loop=None):
+        self.port = SerialPort(port, baud, max_buffer)
+        self.fd = self.port.fd
+        self.on_line = on_line
+        self.on_error = on_error
+        self.loop = loop or asyncio.get_event_loop()
+        self._writing = False
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self.loop.add_reader(self.fd, self._read_ready)
+
+    @property
+    def buffered(self):
+        return self.port.pending
+
+    def stats(self):
+        return self.port.stats()
+
+    def _read_ready(self):
+        try:
+            lines = self.port.read_lines()
+        except (EOFError, OSError) as e:
+            self._fail(e)
+            return
+
+        for line in lines:
+            if self.on_line:
+                self.on_line(line)
+
+    def write(self, data):
+        """
+        Writes without blocking, returns False when the data was dropped because the queue is full.
+        """
+        if self.fd is None or not self.port.write(data):
+            return False
+
+        if not self._writing:
+            self._writing = True
+            self._drained.clear()
+            self.loop.add_writer(self.fd, self._write_ready)
+
+        return True
+
+    async def drain(self):
+        """
+        Waits until everything written so far was handed to the port, or the transport closed.
+        """
+        await self._drained.wait()
+
+    def _write_ready(self):
+        try:
+            flushed = self.port.flush()
+        except OSError as e:
+            self._fail(e)
+            return
+
+        if flushed:
+            self._writing = False
+            self._drained.set()
+            self.loop.remove_writer(self.fd)
+
+    def _fail(self, exc):
+        self.close()
+
+        if self.on_error:
+            self.on_error(exc)
+
+    def close(self):
+        if self.fd is None:
+            return
+
+        self.loop.remove_reader(self.fd)
+
+        if self._writing:
+            self.loop.remove_writer(self.fd)
+            self._writing = False
+
+        self.fd = None
+        self._drained.set()
+        self.port.close()
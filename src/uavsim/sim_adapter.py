@@ -1,15 +1,20 @@
 import argparse
 import asyncio
+import functools
 import logging
 import sys
-from time import sleep
 
 from autobahn import wamp
 from autobahn.wamp.types import RegisterOptions
 from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
 
 from uavsim import flightgear
-from uavsim.flightgear.client import AbstractClient, TelnetClient, UDPClient
+from uavsim.flightgear.client import FG_COMMAND_MAP, AbstractClient, TelnetClient, UDPClient, load_command_map
+from uavsim.scheduler import RateScheduler
+from uavsim.tracing import TRACE_REPORT_INTERVAL, Tracer, stamp_read
+from uavsim.telemetry import (TELEMETRY_BATCH_INTERVAL, TELEMETRY_BATCH_SIZE, TELEMETRY_BATCH_TOPIC,
+                              TELEMETRY_SCHEMA_TOPIC, WIRE_FORMAT_JSON, WIRE_FORMATS, TelemetryPublisher,
+                              TelemetryState)
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,20 +23,79 @@ CROSSBAR_ROUTE = 'ws://127.0.0.1:8091/uavsim'
 FG_CONNECTION_RETRY_DELAY = 5
 
 
-class SimCommanderComponent(ApplicationSession):
+class SimCommanderComponent(TelemetryPublisher, ApplicationSession):
     def __init__(self, config=None):
         ApplicationSession.__init__(self, config)
         self.client: AbstractClient = self.config.extra['client']
+        self.telemetry_groups = self.config.extra.get('telemetry_groups') or flightgear.FG_TELEMETRY_GROUPS
+        self.telemetry_state = TelemetryState(group.name for group in self.telemetry_groups)
+        self.scheduler = RateScheduler()
+        self.tracer = Tracer()
         self.is_running: bool = False
+        self.init_telemetry_publisher()
+
+    @wamp.register('sim.scheduler.stats')
+    def get_scheduler_stats(self):
+        return self.scheduler.stats()
+
+    @wamp.register('sim.trace.stats')
+    def get_trace_stats(self):
+        return self.tracer.stats()
+
+    def publish_telemetry(self, telemetry):
+        TelemetryPublisher.publish_telemetry(self, self.tracer.stamp_publish(telemetry))
+
+    async def report_traces(self):
+        while self.is_running:
+            await asyncio.sleep(TRACE_REPORT_INTERVAL)
+            self.tracer.report()
 
     # @wamp.subscribe('uav.cmd')
     async def on_uav_cmd(self, line):
         logger.debug(line)
-        self.client.send_command(line)
+
+        try:
+            await self.client.send_command(line)
+        except (EOFError, OSError, asyncio.TimeoutError):
+            logger.warning('Unable to send command to FG: {}'.format(line))
 
     async def on_map_position_force(self, lat, lon):
         logger.debug('Position forced: {}, {}'.format(lat, lon))
-        self.client.set_position(lat, lon)
+
+        try:
+            await self.client.set_position(lat, lon)
+        except (EOFError, OSError, asyncio.TimeoutError):
+            logger.warning('Unable to force position: {}, {}'.format(lat, lon))
+
+    def on_fg_telemetry(self, telemetry):
+        self.publish_telemetry(stamp_read(telemetry))
+
+    async def read_telemetry_group(self, group):
+        try:
+            record = await flightgear.read_fg_telemetry(self.client, group.paths)
+        except (EOFError, OSError, asyncio.TimeoutError):
+            await asyncio.sleep(FG_CONNECTION_RETRY_DELAY)
+
+            return
+
+        telemetry = self.telemetry_state.update(group.name, record)
+
+        if telemetry is not None:
+            self.publish_telemetry(telemetry)
+
+    async def connect_client(self):
+        while True:
+            try:
+                await self.client.connect()
+                logger.debug('Connected to FG')
+
+                return
+            except (OSError, asyncio.TimeoutError):
+                logger.warning('Connection to {}:{} failed, retrying after {}s'.format(self.client.host,
+                                                                                       self.client.port,
+                                                                                       FG_CONNECTION_RETRY_DELAY)
+                               )
+                await asyncio.sleep(FG_CONNECTION_RETRY_DELAY)
 
     async def onJoin(self, details):
         await self.register(self, options=RegisterOptions(invoke='roundrobin'))
@@ -41,15 +105,38 @@ class SimCommanderComponent(ApplicationSession):
 
         self.is_running = True
 
-        while self.is_running:
+        await self.connect_client()
+
+        if self.telemetry_batcher:
+            asyncio.ensure_future(self.flush_telemetry_batches())
+
+        asyncio.ensure_future(self.report_traces())
+
+        if isinstance(self.client, UDPClient):
+            await self.client.listen(self.on_fg_telemetry)
+
             try:
-                telemetry = flightgear.read_fg_telemetry(self.config.extra['client'])
+                while self.is_running:
+                    await asyncio.sleep(1)
+            finally:
+                self.client.close()
+
+            return
+
+        for group in self.telemetry_groups:
+            self.scheduler.add(group.name, group.rate, functools.partial(self.read_telemetry_group, group))
 
-                self.publish('sim.telemetry', telemetry)
+        await self.scheduler.run()
 
-                await asyncio.sleep(0.25)
-            except (EOFError, ConnectionResetError, BrokenPipeError, KeyError):
-                await asyncio.sleep(5)
+
+def telemetry_group(value):
+    try:
+        name, spec = value.split('=', 1)
+        paths, rate = spec.rsplit('@', 1)
+
+        return flightgear.TelemetryGroup(name, tuple(paths.split(',')), float(rate))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected NAME=PATH[,PATH...]@HZ, got {!r}'.format(value))
 
 
 def join_to_router(component_class, options):
@@ -99,6 +186,44 @@ if __name__ == '__main__':
         type=int,
         default=5401
     )
+    parser.add_argument(
+        '--command-map',
+        dest='command_map',
+        help='JSON file mapping UAV command ids to the FlightGear properties they set',
+        default=FG_COMMAND_MAP
+    )
+    parser.add_argument(
+        '--telemetry-group',
+        dest='telemetry_groups',
+        help='Telemetry group as NAME=PATH[,PATH...]@HZ read from FlightGear property subtrees at its own rate, '
+             'may be repeated (e.g. position=position@50 attitude=orientation/model@25 velocities=velocities@5)',
+        type=telemetry_group,
+        action='append',
+        default=None
+    )
+    parser.add_argument(
+        '--wire-format',
+        dest='wire_format',
+        help='Telemetry payload format, binary payloads are decoded with the schema announced on {}'.format(
+            TELEMETRY_SCHEMA_TOPIC
+        ),
+        choices=WIRE_FORMATS,
+        default=WIRE_FORMAT_JSON
+    )
+    parser.add_argument(
+        '--batch-size',
+        dest='batch_size',
+        help='Maximum number of samples per frame published on {}, 0 disables batching'.format(TELEMETRY_BATCH_TOPIC),
+        type=int,
+        default=TELEMETRY_BATCH_SIZE
+    )
+    parser.add_argument(
+        '--batch-interval',
+        dest='batch_interval',
+        help='Maximum time span of a frame published on {}, ms'.format(TELEMETRY_BATCH_TOPIC),
+        type=int,
+        default=TELEMETRY_BATCH_INTERVAL
+    )
     parser.add_argument(
         '--udp-out-host',
         dest='udp_out_host',
@@ -130,24 +255,17 @@ if __name__ == '__main__':
     fg_client: AbstractClient = None
 
     if args.telnet_host:
-        fg_client = TelnetClient(args.telnet_host, args.telnet_port)
+        fg_client = TelnetClient(args.telnet_host, args.telnet_port, commands=load_command_map(args.command_map))
     elif args.udp_out_host:
         fg_client = UDPClient(args.udp_out_host, args.udp_out_port)
 
     if fg_client:
-        while True:
-            try:
-                fg_client.connect()
-
-                break
-            except ConnectionRefusedError:
-                logger.warning('Connection to {}:{} failed, retrying after {}s'.format(fg_client.host,
-                                                                                       fg_client.port,
-                                                                                       FG_CONNECTION_RETRY_DELAY)
-                               )
-                sleep(FG_CONNECTION_RETRY_DELAY)
-
-        logger.debug('Connected to FG')
-        join_to_router(SimCommanderComponent, {'client': fg_client})
+        join_to_router(SimCommanderComponent, {
+            'client': fg_client,
+            'telemetry_groups': args.telemetry_groups,
+            'wire_format': args.wire_format,
+            'batch_size': args.batch_size,
+            'batch_interval': args.batch_interval,
+        })
     else:
         logger.critical('Unable to initialize FG client')
@@ -1,70 +1,85 @@
 import argparse
 import asyncio
 import logging
-import os.path
 import sys
+import time
 
-import h5py
-import numpy as np
 from autobahn import wamp
-from autobahn.wamp.types import RegisterOptions
+from autobahn.wamp.types import RegisterOptions, SubscribeOptions
 from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
 
+from uavsim.recording import (
+    COMPRESSION_GZIP, COMPRESSION_LEVEL, COMPRESSIONS, RECORDING_FLUSH_INTERVAL, RECORDING_FLUSH_ROWS,
+    RECORDING_PREFIX, RECORDING_ROLLOVER_INTERVAL, RECORDING_ROLLOVER_SIZE, RecordingSession
+)
+from uavsim.telemetry import TELEMETRY_BATCH_TOPIC, TELEMETRY_SCHEMA_TOPIC, TELEMETRY_TOPIC, TelemetryDecoder
+
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 CROSSBAR_ROUTE = 'ws://127.0.0.1:8091/uavsim'
+SOURCE_SAMPLE = 'sample'
+SOURCE_BATCH = 'batch'
 
 
 class StatisticsComponent(ApplicationSession):
     def __init__(self, config=None):
         ApplicationSession.__init__(self, config)
         self.is_running: bool = False
-        file_path = os.path.join(config.extra['output_dir'], 'swmr_telemetry.h5')
-        self._output_file = h5py.File(file_path, 'a', swmr=True, libver='latest')
-
-        if 'telemetry' in self._output_file:
-            self.telemetry = self._output_file['telemetry']
-        else:
-            self.telemetry = self._output_file.create_group('telemetry')
-            self.telemetry.create_dataset(
-                'axis0', chunks=(10,), maxshape=(None,), data=np.array([b'index', b'speed', b'altitude'], dtype='|S5')
-            )
-            self.telemetry.create_dataset(
-                'axis1', chunks=(10,), maxshape=(None,), data=np.array([], dtype='float64')
-            )
-            self.telemetry.create_dataset(
-                'block0_items', chunks=(10,), maxshape=(None,),
-                data=np.array([b'index', b'speed', b'altitude'], dtype='|S5')
-            )
-            self.telemetry.create_dataset(
-                'block0_values', chunks=(100, 3), maxshape=(None, 3), data=np.array([[.0, .0, .0]], dtype='float64')
-            )
-
-        self._output_file.swmr_mode = True
+        self.telemetry_decoder = TelemetryDecoder()
+        self.recording = RecordingSession(
+            config.extra['output_dir'],
+            prefix=config.extra.get('prefix', RECORDING_PREFIX),
+            rollover_interval=config.extra.get('rollover_interval', RECORDING_ROLLOVER_INTERVAL),
+            rollover_size=config.extra.get('rollover_size', RECORDING_ROLLOVER_SIZE),
+            flush_rows=config.extra.get('flush_rows', RECORDING_FLUSH_ROWS),
+            flush_interval=config.extra.get('flush_interval', RECORDING_FLUSH_INTERVAL),
+            compression=config.extra.get('compression', COMPRESSION_GZIP),
+            compression_level=config.extra.get('compression_level', COMPRESSION_LEVEL),
+        )
 
     # @wamp.subscribe('sim.telemetry')
     async def on_sim_telemetry(self, telemetry):
-        self.telemetry['block0_values'].resize((len(self.telemetry['block0_values'])+1, 3))
-        self.telemetry['block0_values'][-1] = np.array([
-            telemetry['dt'], telemetry['airspeed-kt'], telemetry['altitude-ft']
-        ])
-        self._output_file.flush()
+        telemetry = self.telemetry_decoder.decode(telemetry)
+
+        if telemetry is None:
+            return
+
+        self.recording.append_record(telemetry)
+
+    async def on_sim_telemetry_batch(self, frame):
+        frame = self.telemetry_decoder.decode_frame(frame)
+
+        if frame is None:
+            return
+
+        self.recording.append_frame(frame)
 
     async def onJoin(self, details):
         await self.register(self, options=RegisterOptions(invoke='roundrobin'))
 
-        await self.subscribe(self.on_sim_telemetry, 'sim.telemetry')
+        await self.subscribe(
+            self.telemetry_decoder.on_schema, TELEMETRY_SCHEMA_TOPIC, options=SubscribeOptions(get_retained=True)
+        )
+
+        if self.config.extra.get('source') == SOURCE_SAMPLE:
+            await self.subscribe(self.on_sim_telemetry, TELEMETRY_TOPIC)
+        else:
+            await self.subscribe(self.on_sim_telemetry_batch, TELEMETRY_BATCH_TOPIC)
 
         self.is_running = True
 
         while self.is_running:
             await asyncio.sleep(0.1)
 
+            if self.recording.due(time.monotonic()):
+                self.recording.flush()
+
     async def onLeave(self, details):
-        logger.debug('Closing output file')
-        self.output_file.close()
+        logger.debug('Closing recording session')
+        self.is_running = False
+        self.recording.close()
 
 
 def join_to_router(component_class, options):
@@ -100,7 +115,74 @@ if __name__ == '__main__':
         help='Output directory for statistics',
         default='/tmp'
     )
+    parser.add_argument(
+        '--prefix',
+        dest='prefix',
+        help='File name prefix of the partitions and the index of the recording session',
+        default=RECORDING_PREFIX
+    )
+    parser.add_argument(
+        '--rollover-interval',
+        dest='rollover_interval',
+        help='Start a new partition once the current one spans this many seconds of telemetry, 0 disables',
+        type=float,
+        default=RECORDING_ROLLOVER_INTERVAL
+    )
+    parser.add_argument(
+        '--rollover-size',
+        dest='rollover_size',
+        help='Start a new partition once the current file grows past this many MiB, 0 disables',
+        type=float,
+        default=RECORDING_ROLLOVER_SIZE
+    )
+    parser.add_argument(
+        '--source',
+        dest='source',
+        help='Record every {} event, or frames of {} (needs batching enabled in sim_adapter)'.format(
+            TELEMETRY_TOPIC, TELEMETRY_BATCH_TOPIC
+        ),
+        choices=(SOURCE_SAMPLE, SOURCE_BATCH),
+        default=SOURCE_BATCH
+    )
+    parser.add_argument(
+        '--flush-rows',
+        dest='flush_rows',
+        help='Write buffered rows to the file once this many are collected',
+        type=int,
+        default=RECORDING_FLUSH_ROWS
+    )
+    parser.add_argument(
+        '--flush-interval',
+        dest='flush_interval',
+        help='Write buffered rows to the file at least this often, ms (bounds the delay seen by SWMR readers)',
+        type=int,
+        default=RECORDING_FLUSH_INTERVAL
+    )
+    parser.add_argument(
+        '--compression',
+        dest='compression',
+        help='Compression filter of the recorded telemetry, applied after byte shuffling',
+        choices=COMPRESSIONS,
+        default=COMPRESSION_GZIP
+    )
+    parser.add_argument(
+        '--compression-level',
+        dest='compression_level',
+        help='gzip compression level, 0-9',
+        type=int,
+        default=COMPRESSION_LEVEL
+    )
 
     args = parser.parse_args(sys.argv[1:])
 
-    join_to_router(StatisticsComponent, {'output_dir': args.output_dir})
+    join_to_router(StatisticsComponent, {
+        'output_dir': args.output_dir,
+        'prefix': args.prefix,
+        'rollover_interval': args.rollover_interval,
+        'rollover_size': int(args.rollover_size * 2**20),
+        'source': args.source,
+        'flush_rows': args.flush_rows,
+        'flush_interval': args.flush_interval,
+        'compression': args.compression,
+        'compression_level': args.compression_level,
+    })
@@ -0,0 +1,513 @@
+import asyncio
+import datetime
+import json
+import logging
+import struct
+import time
+import zlib
+
+from autobahn import wamp
+from autobahn.wamp.types import PublishOptions
+
+logger = logging.getLogger(__name__)
+
+
+TELEMETRY_TIMESTAMP = 'dt'
+TELEMETRY_TOPIC = 'sim.telemetry'
+TELEMETRY_SCHEMA_TOPIC = 'sim.telemetry.schema'
+TELEMETRY_BATCH_TOPIC = 'sim.telemetry.batch'
+
+WIRE_FORMAT_JSON = 'json'
+WIRE_FORMAT_BINARY = 'binary'
+WIRE_FORMATS = (WIRE_FORMAT_JSON, WIRE_FORMAT_BINARY)
+
+TELEMETRY_BATCH_SIZE = 50
+# ms
+TELEMETRY_BATCH_INTERVAL = 500
+
+# strings are packed as fixed size, NUL padded fields
+TELEMETRY_STRING_SIZE = 32
+TELEMETRY_TYPE_NAMES = {float: 'float', int: 'int', bool: 'bool', str: 'str'}
+TELEMETRY_TYPES = {name: t for t, name in TELEMETRY_TYPE_NAMES.items()}
+TELEMETRY_STRUCT_CODES = {float: 'd', int: 'q', bool: '?', str: '{}s'.format(TELEMETRY_STRING_SIZE)}
+TELEMETRY_STRUCT_DEFAULTS = {float: 0.0, int: 0, bool: False, str: b''}
+TELEMETRY_FRAME_HEADER = struct.Struct('<II')
+
+
+def utc_timestamp():
+    return datetime.datetime.utcnow().timestamp()
+
+
+class TelemetrySchema(object):
+    """
+    Ordered, typed layout of a telemetry record: a sequence of (name, type) pairs.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.names = tuple(name for name, _ in self.fields)
+        self.types = tuple(t for _, t in self.fields)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __eq__(self, other):
+        return isinstance(other, TelemetrySchema) and self.fields == other.fields
+
+    def __hash__(self):
+        return hash(self.fields)
+
+    def __repr__(self):
+        return 'TelemetrySchema({})'.format(', '.join(self.names))
+
+    @classmethod
+    def from_mapping(cls, telemetry):
+        """
+        Derives a schema from a telemetry mapping, i.e. a JSON decoded telemetry dict.
+        """
+        if isinstance(telemetry, TelemetryRecord):
+            return telemetry.schema
+
+        return cls((name, type(value)) for name, value in telemetry.items() if type(value) in TELEMETRY_TYPE_NAMES)
+
+    def values_of(self, telemetry):
+        """
+        Lays out the values of a telemetry mapping as this schema, missing names become None.
+        """
+        if isinstance(telemetry, TelemetryRecord) and telemetry.schema is self:
+            return telemetry.values
+
+        return [telemetry.get(name) for name in self.names]
+
+    def record(self, values):
+        return TelemetryRecord(self, values)
+
+
+class TelemetryRecord(object):
+    """
+    Fixed-layout telemetry sample. Values are stored positionally, names are resolved through the shared schema.
+
+    Supports the read-only mapping protocol, so consumers written against telemetry dicts keep working.
+    Missing values are stored as None and are treated as absent keys.
+    """
+    __slots__ = ('schema', 'values')
+
+    def __init__(self, schema, values):
+        self.schema = schema
+        self.values = values
+
+    def __getitem__(self, key):
+        value = self.values[self.schema.index[key]]
+
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return [name for name, value in zip(self.schema.names, self.values) if value is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(name, value) for name, value in zip(self.schema.names, self.values) if value is not None]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return 'TelemetryRecord({!r})'.format(self.to_dict())
+
+
+class TelemetryState(object):
+    """
+    Latest values of several independently sampled telemetry groups, combined into one record.
+
+    Every group record starts with the timestamp, which becomes the timestamp of the combined record. The combined
+    schema is fixed once each group has delivered its first record, no record is produced before that.
+    """
+
+    def __init__(self, groups):
+        self.groups = tuple(groups)
+        self.schema = None
+        self.values = None
+        self._fields = [(TELEMETRY_TIMESTAMP, float)]
+        self._group_schemas = {}
+        self._group_values = {}
+        self._slots = {}
+
+    def _add_group(self, name, schema):
+        names = set(field for field, _ in self._fields)
+
+        for field in schema.fields:
+            if field[0] not in names:
+                self._fields.append(field)
+
+        self._group_schemas[name] = schema
+
+        if len(self._group_schemas) == len(self.groups):
+            self.schema = TelemetrySchema(self._fields)
+            self.values = [None] * len(self.schema)
+            self._slots = {
+                group: tuple(self.schema.index[field] for field in group_schema.names)
+                for group, group_schema in self._group_schemas.items()
+            }
+
+            for group, values in self._group_values.items():
+                self._merge(group, values)
+
+    def _merge(self, name, values):
+        target = self.values
+
+        for slot, value in zip(self._slots[name], values):
+            target[slot] = value
+
+    def update(self, name, record):
+        """
+        Merges a group record and returns a snapshot of the combined record, or None while it's still incomplete.
+        """
+        if self._group_schemas.get(name) != record.schema:
+            # first record of the group, or its layout changed
+            self._group_values[name] = record.values
+            self.schema = None
+            self._add_group(name, record.schema)
+        elif self.schema is None:
+            self._group_values[name] = record.values
+
+        if self.schema is None:
+            return None
+
+        self._merge(name, record.values)
+
+        return TelemetryRecord(self.schema, list(self.values))
+
+
+class TelemetryCodec(object):
+    """
+    Packs telemetry values of one schema into little-endian binary payloads and back.
+
+    Payload layout: schema id (uint32), bitmask of missing values, then every field packed with a fixed size.
+    The schema itself travels once, as the description announced on TELEMETRY_SCHEMA_TOPIC.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.description = {
+            'fields': [[name, TELEMETRY_TYPE_NAMES[t]] for name, t in schema.fields],
+        }
+        self.schema_id = zlib.crc32(json.dumps(self.description['fields']).encode('utf-8'))
+        self.description['id'] = self.schema_id
+        self._mask_size = (len(schema) + 7) // 8
+        self._struct = struct.Struct('<I{}s{}'.format(
+            self._mask_size, ''.join(TELEMETRY_STRUCT_CODES[t] for t in schema.types)
+        ))
+        self._defaults = tuple(TELEMETRY_STRUCT_DEFAULTS[t] for t in schema.types)
+        self._strings = tuple(i for i, t in enumerate(schema.types) if t is str)
+        self._no_missing = bytes(self._mask_size)
+
+    @classmethod
+    def from_description(cls, description):
+        return cls(TelemetrySchema((name, TELEMETRY_TYPES[t]) for name, t in description['fields']))
+
+    @staticmethod
+    def schema_id_of(payload):
+        return struct.unpack_from('<I', payload)[0]
+
+    def encode(self, values):
+        missing = self._no_missing
+
+        if None in values or self._strings:
+            values = list(values)
+            mask = 0
+
+            for i, value in enumerate(values):
+                if value is None:
+                    mask |= 1 << i
+                    values[i] = self._defaults[i]
+
+            for i in self._strings:
+                if not isinstance(values[i], bytes):
+                    values[i] = values[i].encode('utf-8')
+
+            missing = mask.to_bytes(self._mask_size, 'little')
+
+        return self._struct.pack(self.schema_id, missing, *values)
+
+    def decode(self, payload):
+        """
+        Unpacks a payload into a TelemetryRecord, no per-sample dict is built.
+        """
+        schema_id, missing, *values = self._struct.unpack(payload)
+
+        for i in self._strings:
+            values[i] = values[i].rstrip(b'\0').decode('utf-8')
+
+        if missing != self._no_missing:
+            mask = int.from_bytes(missing, 'little')
+
+            for i in range(len(values)):
+                if mask & (1 << i):
+                    values[i] = None
+
+        return TelemetryRecord(self.schema, values)
+
+    def encode_frame(self, rows):
+        """
+        Packs a list of value lists column by column.
+
+        Frame layout: schema id and row count (uint32 each), then for every field a flag byte, a bitmask of missing
+        rows when the flag is set, and all values of the column packed back to back.
+        """
+        count = len(rows)
+        chunks = [TELEMETRY_FRAME_HEADER.pack(self.schema_id, count)]
+
+        for i, column in enumerate(zip(*rows)):
+            if None in column:
+                column = list(column)
+                mask = 0
+
+                for row, value in enumerate(column):
+                    if value is None:
+                        mask |= 1 << row
+                        column[row] = self._defaults[i]
+
+                chunks.append(b'\x01')
+                chunks.append(mask.to_bytes((count + 7) // 8, 'little'))
+            else:
+                chunks.append(b'\x00')
+
+            t = self.schema.types[i]
+
+            if t is str:
+                column = [value if isinstance(value, bytes) else value.encode('utf-8') for value in column]
+
+            chunks.append(struct.pack(self._column_format(t, count), *column))
+
+        return b''.join(chunks)
+
+    def encode_frame_json(self, rows):
+        return {'schema': self.description, 'columns': [list(column) for column in zip(*rows)]}
+
+    @staticmethod
+    def _column_format(t, count):
+        if t is str:
+            return '<' + TELEMETRY_STRUCT_CODES[str] * count
+
+        return '<{}{}'.format(count, TELEMETRY_STRUCT_CODES[t])
+
+    def decode_frame(self, payload):
+        _, count = TELEMETRY_FRAME_HEADER.unpack_from(payload)
+        offset = TELEMETRY_FRAME_HEADER.size
+        mask_size = (count + 7) // 8
+        columns = []
+
+        for t in self.schema.types:
+            mask = None
+
+            if payload[offset]:
+                mask = int.from_bytes(payload[offset + 1:offset + 1 + mask_size], 'little')
+                offset += mask_size
+
+            offset += 1
+            column_format = self._column_format(t, count)
+            column = list(struct.unpack_from(column_format, payload, offset))
+            offset += struct.calcsize(column_format)
+
+            if t is str:
+                column = [value.rstrip(b'\0').decode('utf-8') for value in column]
+
+            if mask:
+                for row in range(count):
+                    if mask & (1 << row):
+                        column[row] = None
+
+            columns.append(column)
+
+        return TelemetryFrame(self.schema, columns)
+
+
+class TelemetryFrame(object):
+    """
+    Columnar batch of telemetry samples sharing one schema.
+    """
+    __slots__ = ('schema', 'columns')
+
+    def __init__(self, schema, columns):
+        self.schema = schema
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name):
+        return self.columns[self.schema.index[name]]
+
+    def records(self):
+        for values in zip(*self.columns):
+            yield TelemetryRecord(self.schema, list(values))
+
+
+class TelemetryBatcher(object):
+    """
+    Collects records into frames of at most `size` rows spanning at most `interval` seconds.
+
+    Completed frames are passed to on_frame(schema, rows); a schema change always completes the current frame.
+    """
+
+    def __init__(self, size, interval, on_frame):
+        self.size = size
+        self.interval = interval
+        self.on_frame = on_frame
+        self.schema = None
+        self.rows = []
+        self.started = None
+
+    def append(self, record, now):
+        if record.schema is not self.schema:
+            self.flush()
+            self.schema = record.schema
+
+        if not self.rows:
+            self.started = now
+
+        self.rows.append(record.values)
+
+        if len(self.rows) >= self.size or now - self.started >= self.interval:
+            self.flush()
+
+    def due(self, now):
+        return bool(self.rows) and now - self.started >= self.interval
+
+    def flush(self):
+        if self.rows:
+            rows = self.rows
+            self.rows = []
+            self.on_frame(self.schema, rows)
+
+
+class TelemetryPublisher(object):
+    """
+    Publishing side of the telemetry wire format, mixed into the ApplicationSession of a telemetry source.
+
+    Records are published on TELEMETRY_TOPIC in the configured wire format, with their schema retained on
+    TELEMETRY_SCHEMA_TOPIC whenever it changes, and in frames on TELEMETRY_BATCH_TOPIC unless batching is disabled.
+    init_telemetry_publisher reads the wire_format, batch_size and batch_interval (ms) options from config.extra.
+    """
+
+    def init_telemetry_publisher(self):
+        self.wire_format = self.config.extra.get('wire_format') or WIRE_FORMAT_JSON
+        self.telemetry_codec = None
+        self.telemetry_batcher = None
+
+        batch_size = self.config.extra.get('batch_size', TELEMETRY_BATCH_SIZE)
+
+        if batch_size:
+            batch_interval = self.config.extra.get('batch_interval', TELEMETRY_BATCH_INTERVAL) / 1000
+            self.telemetry_batcher = TelemetryBatcher(batch_size, batch_interval, self.publish_telemetry_batch)
+
+    @wamp.register('sim.telemetry.schema')
+    def get_telemetry_schema(self):
+        return self.telemetry_codec.description if self.telemetry_codec else None
+
+    def get_telemetry_codec(self, schema):
+        codec = self.telemetry_codec
+
+        if codec is None or codec.schema is not schema:
+            codec = self.telemetry_codec = TelemetryCodec(schema)
+            self.publish(TELEMETRY_SCHEMA_TOPIC, codec.description, options=PublishOptions(retain=True))
+
+        return codec
+
+    def publish_telemetry(self, telemetry):
+        if self.telemetry_batcher:
+            self.telemetry_batcher.append(telemetry, time.monotonic())
+
+        codec = self.get_telemetry_codec(telemetry.schema)
+
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            self.publish(TELEMETRY_TOPIC, codec.encode(telemetry.values))
+        else:
+            self.publish(TELEMETRY_TOPIC, telemetry.to_dict())
+
+    def publish_telemetry_batch(self, schema, rows):
+        codec = self.get_telemetry_codec(schema)
+
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            self.publish(TELEMETRY_BATCH_TOPIC, codec.encode_frame(rows))
+        else:
+            self.publish(TELEMETRY_BATCH_TOPIC, codec.encode_frame_json(rows))
+
+    async def flush_telemetry_batches(self):
+        """
+        Publishes frames that are due while no further record completes them, until is_running is cleared.
+        """
+        while self.is_running:
+            await asyncio.sleep(self.telemetry_batcher.interval / 2)
+
+            if self.telemetry_batcher.due(time.monotonic()):
+                self.telemetry_batcher.flush()
+
+
+class TelemetryDecoder(object):
+    """
+    Subscriber side of the telemetry wire format: turns either JSON dicts or binary payloads into mappings.
+
+    Binary payloads are decoded with the schema announced on TELEMETRY_SCHEMA_TOPIC, which should be subscribed to
+    with on_schema (with retained events, so the current schema is delivered on subscription).
+    """
+
+    def __init__(self):
+        self.codecs = {}
+
+    def on_schema(self, description):
+        if description['id'] not in self.codecs:
+            self.codecs[description['id']] = TelemetryCodec.from_description(description)
+            logger.debug('Telemetry schema {} received'.format(description['id']))
+
+    def decode(self, telemetry):
+        """
+        Returns the telemetry as a mapping, or None when it's binary and its schema is still unknown.
+        """
+        if not isinstance(telemetry, (bytes, bytearray)):
+            return telemetry
+
+        codec = self.codecs.get(TelemetryCodec.schema_id_of(telemetry))
+
+        if codec is None:
+            logger.debug('Telemetry with unknown schema dropped')
+
+            return None
+
+        return codec.decode(telemetry)
+
+    def decode_frame(self, frame):
+        """
+        Returns a TelemetryFrame for either a JSON or a binary frame, or None when the binary schema is unknown.
+        """
+        if not isinstance(frame, (bytes, bytearray)):
+            self.on_schema(frame['schema'])
+
+            return TelemetryFrame(self.codecs[frame['schema']['id']].schema, frame['columns'])
+
+        codec = self.codecs.get(TelemetryCodec.schema_id_of(frame))
+
+        if codec is None:
+            logger.debug('Telemetry frame with unknown schema dropped')
+
+            return None
+
+        return codec.decode_frame(frame)
@@ -0,0 +1,167 @@
+import bisect
+import itertools
+import logging
+import time
+
+from uavsim.telemetry import TelemetryRecord, TelemetrySchema
+
+logger = logging.getLogger(__name__)
+
+
+# Trace fields appended to telemetry records. Stamps are time.monotonic() seconds, which is one clock for all
+# processes of a host, so hops between components are only meaningful while they run on the same machine.
+TRACE_ID = 'trace-id'
+TRACE_READ = 'trace-read'
+TRACE_PUBLISH = 'trace-publish'
+TRACE_FIELDS = (TRACE_ID, TRACE_READ, TRACE_PUBLISH)
+
+HOP_READ_PUBLISH = 'read-publish'
+HOP_PUBLISH_RECEIVE = 'publish-receive'
+HOP_RECEIVE_WRITE = 'receive-write'
+HOP_READ_WRITE = 'read-write'
+
+TRACE_REPORT_INTERVAL = 10.0
+# histogram bucket bounds, 10 per decade from 10 us to 100 s
+TRACE_BUCKETS = tuple(10 ** (exponent / 10) for exponent in range(-50, 21))
+
+_extended_schemas = {}
+_stripped_schemas = {}
+
+
+def trace_clock():
+    return time.monotonic()
+
+
+def extend_record(record, fields, values):
+    """
+    Sets fields of a record, appending the ones its schema doesn't have. Extended schemas are cached, so records of
+    one schema keep sharing one.
+    """
+    key = (record.schema, fields)
+    schema = _extended_schemas.get(key)
+
+    if schema is None:
+        present = set(record.schema.names)
+        schema = _extended_schemas[key] = TelemetrySchema(
+            tuple(record.schema.fields) + tuple(field for field in fields if field[0] not in present)
+        )
+
+    extended = list(record.values) + [None] * (len(schema) - len(record.schema))
+
+    for (name, _), value in zip(fields, values):
+        extended[schema.index[name]] = value
+
+    return TelemetryRecord(schema, extended)
+
+
+def strip_trace(record):
+    """
+    The record without its trace fields, e.g. a recorded sample whose stamps belong to the run that recorded it.
+    """
+    stripped = _stripped_schemas.get(record.schema)
+
+    if stripped is None:
+        kept = [i for i, name in enumerate(record.schema.names) if name not in TRACE_FIELDS]
+        schema = record.schema if len(kept) == len(record.schema) else TelemetrySchema(
+            record.schema.fields[i] for i in kept
+        )
+        stripped = _stripped_schemas[record.schema] = (schema, kept)
+
+    schema, kept = stripped
+
+    if schema is record.schema:
+        return record
+
+    values = record.values
+
+    return TelemetryRecord(schema, [values[i] for i in kept])
+
+
+def stamp_read(record):
+    """
+    Stamps the time a telemetry record was read from FlightGear.
+    """
+    return extend_record(record, ((TRACE_READ, float),), (trace_clock(),))
+
+
+class LatencyHistogram(object):
+    """
+    Log-bucketed latency histogram, percentiles are reported as the upper bound of their bucket.
+    """
+
+    def __init__(self, buckets=TRACE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+
+        return self.max
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'p50-ms': self.percentile(0.5) * 1000,
+            'p99-ms': self.percentile(0.99) * 1000,
+            'max-ms': self.max * 1000,
+        }
+
+
+class Tracer(object):
+    """
+    Assigns trace ids to published telemetry and aggregates per-hop latency histograms since the last report.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.histograms = {}
+        self._last_stats = {}
+
+    def record(self, hop, seconds):
+        histogram = self.histograms.get(hop)
+
+        if histogram is None:
+            histogram = self.histograms[hop] = LatencyHistogram()
+
+        histogram.add(seconds)
+
+    def stamp_publish(self, record):
+        published = trace_clock()
+        read = record.get(TRACE_READ)
+
+        if read is not None:
+            self.record(HOP_READ_PUBLISH, published - read)
+
+        return extend_record(record, ((TRACE_ID, int), (TRACE_PUBLISH, float)), (next(self.ids), published))
+
+    def stats(self):
+        """
+        Histogram statistics of the last completed report interval, per hop.
+        """
+        return self._last_stats
+
+    def report(self):
+        self._last_stats = {hop: histogram.stats() for hop, histogram in self.histograms.items()}
+        self.histograms = {}
+
+        for hop, stats in sorted(self._last_stats.items()):
+            logger.info('{}: {} samples, p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms'.format(
+                hop, stats['count'], stats['p50-ms'], stats['p99-ms'], stats['max-ms']
+            ))
@@ -1,17 +1,19 @@
 import argparse
 import asyncio
 import logging
-import os
 import sys
-from time import gmtime, strftime, sleep
+from time import sleep
 
-import pyudev
-from autobahn.wamp.types import RegisterOptions
+from autobahn import wamp
+from autobahn.wamp.types import RegisterOptions, SubscribeOptions
 from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
-from decimal import Decimal
 
-from serial import Serial
-from serial.serialutil import SerialException
+from uavsim.hotplug import DeviceMonitor
+from uavsim.nmea import NMEA_BAUD, NMEA_SENTENCES, NMEAEncoder, parse_rates
+from uavsim.telemetry import TELEMETRY_SCHEMA_TOPIC, TELEMETRY_TOPIC, TelemetryDecoder
+from uavsim.tracing import (HOP_PUBLISH_RECEIVE, HOP_READ_WRITE, HOP_RECEIVE_WRITE, TRACE_PUBLISH, TRACE_READ,
+                            TRACE_REPORT_INTERVAL, Tracer, trace_clock)
+from uavsim.uav_link import LINK_QUEUE_POLICY, LINK_QUEUE_SIZE, POLICIES, UAVLink
 
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -20,125 +22,149 @@ logger = logging.getLogger(__name__)
 CROSSBAR_ROUTE = 'ws://127.0.0.1:8091/uavsim'
 
 
-def generate_nmea_sentences(telemetry):
-    dt = gmtime()
-    t = strftime('%H%M%S', dt)
-    d = strftime('%d%m%y', dt)
-    alt = Decimal(telemetry['altitude-ft']) * Decimal('0.3048')
-    lat = telemetry['latitude-deg']
-    lon = telemetry['longitude-deg']
-    lat_half = 'N' if lat > 0 else 'S'
-    lon_half = 'E' if lon > 0 else 'W'
-    lat = lat*100 if lat > 0 else lat * -100
-    lon = lon*100 if lon > 0 else lon * -100
+class UAVAdapterComponent(ApplicationSession):
+    """
+    Sends simulator telemetry as NMEA to any number of flight controllers. Every sample is encoded once and every
+    link gets the sentences its own schedule calls for.
+    """
 
-    heading = telemetry['heading-deg']
-    roll_x = telemetry['roll-deg']
-    pitch_y = telemetry['pitch-deg']
-    # yaw-deg is '' for some reason
-    yaw_z = heading
+    def __init__(self, config=None):
+        ApplicationSession.__init__(self, config)
+        options = self.config.extra['options']
+        self.baud = options.baud
+        self.rates = parse_rates(options.rates)
+        self.queue_size = options.queue_size
+        self.queue_policy = options.queue_policy
+        self.links = {}
+        self.devices = None
+        self.telemetry_decoder = TelemetryDecoder()
+        self.nmea_encoder = NMEAEncoder()
+        self.tracer = Tracer()
+
+    @wamp.register('uav.trace.stats')
+    def get_trace_stats(self):
+        return self.tracer.stats()
+
+    @wamp.register('uav.link.stats')
+    def get_link_stats(self):
+        return {path: link.stats() for path, link in self.links.items()}
+
+    def add_link(self, path):
+        if path in self.links:
+            return
+
+        link = self.links[path] = UAVLink(
+            path, self.baud, self.rates, on_line=self.on_uav_line, on_written=self.trace_write,
+            queue_size=self.queue_size, queue_policy=self.queue_policy
+        )
+        link.start()
+
+    def remove_link(self, path):
+        link = self.links.pop(path, None)
+
+        if link:
+            logger.info('Closing serial port {}'.format(path))
+            link.close()
+
+    def on_uav_line(self, line):
+        self.publish('uav.cmd', str(line, 'utf-8', 'replace'))
+
+    def write_to_uav(self, data):
+        logger.debug(data)
+
+        for link in self.links.values():
+            link.send(data)
+
+    def send_nmea_sentence_to_uav(self, nmea_sentence):
+        self.write_to_uav('{}\n'.format(nmea_sentence).encode('utf-8'))
 
-    speed_over_ground = telemetry['groundspeed-kt']
+    async def on_sim_telemetry(self, telemetry):
+        received = trace_clock()
+        telemetry = self.telemetry_decoder.decode(telemetry)
 
-    gpgga = '$GPGGA,{}.000,{:09.4f},{},{:010.4f},{},1,7,1.15,{},M,23.7,M,,*6F'.format(
-        t, lat, lat_half, lon, lon_half, alt)
-    gprmc = '$GPRMC,{}.000,A,{:09.4f},{},{:010.4f},{},{:.2f},267.70,{},,,A*6D'.format(
-        t, lat, lat_half, lon, lon_half, speed_over_ground, d)
-    exinj = '$EXINJ,{},{},{},{},NA'.format(heading, roll_x, pitch_y, yaw_z)
+        if telemetry is None:
+            return
 
-    return [gpgga, gprmc, exinj]
+        published = telemetry.get(TRACE_PUBLISH)
 
+        if published is not None:
+            self.tracer.record(HOP_PUBLISH_RECEIVE, received - published)
 
-class UAVAdapterComponent(ApplicationSession):
-    def __init__(self, config=None):
-        ApplicationSession.__init__(self, config)
-        self.serial_port = None
+        # the write hops are recorded by the links once the port took the frame
+        stamps = (received, telemetry.get(TRACE_READ))
+        now = asyncio.get_event_loop().time()
+        due = [(link, link.scheduler.due(now)) for link in self.links.values() if link.connected]
+        wanted = set()
 
-    @staticmethod
-    def _detect_device_path():
-        context = pyudev.Context()
-        devices = context.list_devices(subsystem='usb', driver='cdc_acm', PRODUCT='f055/9800/200')
+        for _, sentences in due:
+            wanted.update(sentences)
 
-        for device in devices:
-            if device.properties.get('INTERFACE') == '2/2/1':
-                break
-        else:
-            device = None
-
-        if device is None:
-            logger.info('No device found, waiting for it')
-            monitor = pyudev.Monitor.from_netlink(context)
-            monitor.filter_by(subsystem='usb')
-
-            for device in iter(monitor.poll, None):
-                if device.action == 'add':
-                    if device.properties['PRODUCT'] == 'f055/9800/200' and device.properties.get('INTERFACE') == '2/2/1':
-                        break
+        if not wanted:
+            return
 
-        device_filename = os.listdir(f'{device.sys_path}/tty/')[0]
+        # encoded once for all links, each one gets its sentences of the sample in one write
+        encoder = self.nmea_encoder
+        data = encoder.encode(telemetry, [sentence for sentence in NMEA_SENTENCES if sentence in wanted])
 
-        return f'/dev/{device_filename}'
+        for link, sentences in due:
+            if sentences:
+                if link.queue.full:
+                    # block policy, the telemetry handler waits for the link
+                    await link.queue.ready()
 
-    async def connect_serial_port(self, path=None):
-        if self.serial_port:
-            self.serial_port.close()
-            self.serial_port = None
+                link.send(encoder.select(data, sentences), sentences, encoder.sizes, stamps)
+                link.scheduler.sent(sentences, encoder.sizes)
 
-        if not path:
-            logger.info('Looking for a device')
-            path = self._detect_device_path()
+    def trace_write(self, stamps):
+        written = trace_clock()
+        received, read = stamps
+        self.tracer.record(HOP_RECEIVE_WRITE, written - received)
 
-        try:
-            await asyncio.sleep(1)
-            self.serial_port = Serial(path)
-            logger.info('Connected to serial port {}'.format(path))
-        except SerialException:
-            logger.warning('Error while opening serial port at {}'.format(path))
-            await asyncio.sleep(5)
-
-    async def send_nmea_sentence_to_uav(self, nmea_sentence):
-        logger.debug(nmea_sentence)
-
-        if self.serial_port:
-            try:
-                self.serial_port.write('{}\n'.format(nmea_sentence).encode('utf-8'))
-            except (AttributeError, SerialException):
-                await self.connect_serial_port(self.config.extra['options'].serial)
+        if read is not None:
+            self.tracer.record(HOP_READ_WRITE, written - read)
 
-    async def on_sim_telemetry(self, telemetry):
-        nmea_sentences = generate_nmea_sentences(telemetry)
+    def report_stats(self):
+        now = asyncio.get_event_loop().time()
+        self.tracer.report()
 
-        for nmea_sentence in nmea_sentences:
-            await self.send_nmea_sentence_to_uav(nmea_sentence)
+        for link in self.links.values():
+            link.report(now)
 
     async def on_map_pid_force(self, kp, ki, kd):
-        await self.send_nmea_sentence_to_uav(f'$EXTPID,{kp},{ki},{kd},NA')
+        self.send_nmea_sentence_to_uav(f'$EXTPID,{kp},{ki},{kd},NA')
 
     async def onJoin(self, details):
         await self.register(self, options=RegisterOptions(invoke='roundrobin'))
 
-        await self.subscribe(self.on_sim_telemetry, 'sim.telemetry')
+        await self.subscribe(
+            self.telemetry_decoder.on_schema, TELEMETRY_SCHEMA_TOPIC, options=SubscribeOptions(get_retained=True)
+        )
+        await self.subscribe(self.on_sim_telemetry, TELEMETRY_TOPIC)
         await self.subscribe(self.on_map_pid_force, 'map.pid')
 
-        try:
-            await self.connect_serial_port(self.config.extra['options'].serial)
+        paths = self.config.extra['options'].serial
 
+        if paths:
+            for path in paths:
+                self.add_link(path)
+        else:
+            logger.info('Looking for devices')
+            self.devices = DeviceMonitor(on_add=self.add_link, on_remove=self.remove_link)
+            self.devices.start()
+
+        try:
+            # serial I/O runs in the link writer tasks and the transport callbacks
             while True:
-                try:
-                    if self.serial_port:
-                        if self.serial_port.in_waiting:
-                            line = self.serial_port.readline().decode('utf-8').rstrip('\n')
-                            self.publish('uav.cmd', line)
-
-                    await asyncio.sleep(0.5)
-                except (EOFError, ConnectionResetError, BrokenPipeError, KeyError, OSError, SerialException):
-                    logger.error('Connection with serial port failed, reconnecting...')
-                    await self.connect_serial_port(self.config.extra['options'].serial)
+                await asyncio.sleep(TRACE_REPORT_INTERVAL)
+                self.report_stats()
         finally:
-            logger.debug('Closing serial port')
-            if self.serial_port:
-                self.serial_port.close()
-                del self.serial_port
+            if self.devices:
+                self.devices.stop()
+
+            logger.debug('Closing serial ports')
+
+            for path in list(self.links):
+                self.remove_link(path)
 
 
 def join_to_router(component_class, options):
@@ -178,8 +204,38 @@ if __name__ == '__main__':
     parser.add_argument(
         '--serial',
         dest='serial',
-        help='Send data over a serial port',
-        default=None
+        help='Send data over a serial port, can be repeated. All matching USB devices are used when not given',
+        action='append',
+        default=[]
+    )
+    parser.add_argument(
+        '--baud',
+        dest='baud',
+        help='Serial port baud rate, the NMEA sentences are scheduled to fit it',
+        type=int,
+        default=NMEA_BAUD
+    )
+    parser.add_argument(
+        '--rate',
+        dest='rates',
+        help='NMEA sentence rate as SENTENCE=HZ (EXINJ, GGA, RMC, VTG, HDT), 0 disables it, can be repeated',
+        action='append',
+        default=[]
+    )
+    parser.add_argument(
+        '--queue-size',
+        dest='queue_size',
+        help='Outbound frames queued per serial link while the port is busy',
+        type=int,
+        default=LINK_QUEUE_SIZE
+    )
+    parser.add_argument(
+        '--queue-policy',
+        dest='queue_policy',
+        help='What a full outbound queue does: block the telemetry handler, drop the oldest frame, or keep only the '
+             'latest sentence of every type',
+        choices=POLICIES,
+        default=LINK_QUEUE_POLICY
     )
 
     args = parser.parse_args(sys.argv[1:])
@@ -0,0 +1,284 @@
+import asyncio
+import collections
+import itertools
+import logging
+
+from serial.serialutil import SerialException
+
+from uavsim.nmea import NMEA_BAUD, NMEAScheduler
+from uavsim.serial_port import SerialTransport
+
+logger = logging.getLogger(__name__)
+
+
+LINK_RETRY_INTERVAL = 0.5
+
+# what a full outbound queue does with another frame: wait for room, drop the oldest frame, or, per sentence type,
+# keep only the latest sentence and drop the oldest entry when still full
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop-oldest'
+POLICY_LATEST = 'latest'
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST)
+LINK_QUEUE_SIZE = 16
+LINK_QUEUE_POLICY = POLICY_LATEST
+
+
+class OutboundQueue(object):
+    """
+    Bounded queue of outbound frames of one link. The writer takes everything queued at once, so whatever piled up
+    while the port was busy goes out with one write.
+
+    With the latest policy, frames put with a key (the sentence type) replace a queued frame of the same key in place,
+    so a slow link gets every sentence type at its freshest instead of a growing backlog.
+
+    Every frame can carry trace stamps, returned with the data of the frames that are still queued when taken.
+    """
+
+    def __init__(self, maxsize=LINK_QUEUE_SIZE, policy=LINK_QUEUE_POLICY):
+        if policy not in POLICIES:
+            raise ValueError('Unknown queue policy: {}'.format(policy))
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = collections.OrderedDict()
+        self.ids = itertools.count()
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put_nowait(self, data, key=None, stamps=None):
+        """
+        Queues a frame without waiting, returns False when the frame itself was dropped.
+        """
+        entries = self.entries
+
+        if self.policy == POLICY_LATEST and key is not None:
+            if key in entries:
+                entries[key] = (data, stamps)
+                self.coalesced += 1
+                return True
+        else:
+            key = next(self.ids)
+
+        if len(entries) >= self.maxsize:
+            self.dropped += 1
+
+            if self.policy == POLICY_BLOCK:
+                return False
+
+            entries.popitem(last=False)
+
+        entries[key] = (data, stamps)
+        self.max_depth = max(self.max_depth, len(entries))
+        self.not_empty.set()
+
+        if len(entries) >= self.maxsize:
+            self.not_full.clear()
+
+        return True
+
+    @property
+    def full(self):
+        """
+        True when a frame put now would be dropped, only the block policy drops new frames.
+        """
+        return self.policy == POLICY_BLOCK and len(self.entries) >= self.maxsize
+
+    async def ready(self):
+        """
+        Waits until a frame can be put without being dropped.
+        """
+        while self.full:
+            await self.not_full.wait()
+
+    async def get(self):
+        """
+        Waits for frames and returns all queued ones joined, or b'' when woken up without any, with the distinct trace
+        stamps they carried.
+        """
+        await self.not_empty.wait()
+        self.not_empty.clear()
+        entries = list(self.entries.values())
+        self.entries.clear()
+        self.not_full.set()
+        stamps = []
+
+        for _, frame_stamps in entries:
+            # the sentences of one sample share their stamps
+            if frame_stamps is not None and (not stamps or stamps[-1] is not frame_stamps):
+                stamps.append(frame_stamps)
+
+        return b''.join([data for data, _ in entries]), stamps
+
+    def wake(self):
+        self.not_empty.set()
+
+    def clear(self):
+        self.entries.clear()
+        self.not_full.set()
+
+    def stats(self):
+        """
+        Depth, the maximum depth since the last report and the total drop and coalescing counters.
+        """
+        return {
+            'policy': self.policy,
+            'depth': len(self.entries),
+            'max-depth': self.max_depth,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
+
+
+class UAVLink(object):
+    """
+    One serial link to a flight controller, with its own sentence schedule, writer task and health counters.
+
+    Frames are handed to the writer task through an OutboundQueue, and the writer only takes the next frames once the
+    port took the previous ones, so a slow port backs up into the queue and its policy. A link that stalls or
+    reconnects never holds up the others, unless the block policy was chosen. Frames sent while the link is down are
+    dropped rather than delivered late.
+    """
+
+    def __init__(self, path, baud=NMEA_BAUD, rates=None, on_line=None, on_written=None, queue_size=LINK_QUEUE_SIZE,
+                 queue_policy=LINK_QUEUE_POLICY, loop=None):
+        self.path = path
+        self.baud = baud
+        self.on_line = on_line
+        self.on_written = on_written
+        self.loop = loop or asyncio.get_event_loop()
+        self.scheduler = NMEAScheduler(baud, rates, name=path)
+        self.transport = None
+        self.queue = OutboundQueue(queue_size, queue_policy)
+        self.task = None
+
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
+        self.connects = 0
+        self.last_write = None
+        self._reported = (0, 0)
+
+    @property
+    def connected(self):
+        return self.transport is not None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def connect(self):
+        try:
+            self.transport = SerialTransport(
+                self.path, self.baud, on_line=self.on_line, on_error=self.on_error, loop=self.loop
+            )
+        except SerialException as e:
+            logger.warning('Error while opening serial port at {}: {}'.format(self.path, e))
+            return False
+
+        self.connects += 1
+        logger.info('Connected to serial port {}'.format(self.path))
+
+        return True
+
+    def on_error(self, exc):
+        logger.error('Connection with serial port {} failed ({}), reconnecting...'.format(self.path, exc))
+        self.errors += 1
+        self.transport = None
+        self.queue.clear()
+        # wakes the writer task up to reconnect
+        self.queue.wake()
+
+    def send(self, frame, sentences=(), sizes=None, stamps=None):
+        """
+        Queues a frame, made of the given sentences with the given sizes. The latest policy queues every sentence on
+        its own, so it can be replaced by a fresher one of the same type. With the block policy, await queue.ready()
+        first or the frame may be dropped.
+
+        `stamps` are passed to on_written once the port took the frame.
+        """
+        if self.transport is None:
+            self.dropped += 1
+            return
+
+        if self.queue.policy == POLICY_LATEST and sentences:
+            start = 0
+
+            for sentence in sentences:
+                end = start + sizes[sentence]
+                self.queue.put_nowait(frame[start:end], sentence, stamps)
+                start = end
+        else:
+            self.queue.put_nowait(frame, stamps=stamps)
+
+    async def run(self):
+        while True:
+            if self.transport is None and not self.connect():
+                await asyncio.sleep(LINK_RETRY_INTERVAL)
+                continue
+
+            transport = self.transport
+            data, stamps = await self.queue.get()
+
+            if not data or transport is not self.transport:
+                continue
+
+            if not transport.write(data):
+                self.dropped += 1
+                continue
+
+            # backpressure: the next frames wait in the queue until the port took these
+            await transport.drain()
+
+            if transport is not self.transport:
+                # closed before the port took them
+                continue
+
+            self.frames += 1
+            self.last_write = self.loop.time()
+
+            if self.on_written:
+                for frame_stamps in stamps:
+                    self.on_written(frame_stamps)
+
+    def stats(self):
+        return dict(
+            self.scheduler.stats(),
+            path=self.path,
+            connected=self.connected,
+            frames=self.frames,
+            dropped=self.dropped,
+            errors=self.errors,
+            connects=self.connects,
+            queue=self.queue.stats(),
+            serial=self.transport.stats() if self.transport else None,
+        )
+
+    def report(self, now):
+        self.scheduler.report(now)
+        queue = self.queue
+        dropped = queue.dropped - self._reported[0]
+        coalesced = queue.coalesced - self._reported[1]
+
+        if dropped or coalesced:
+            logger.info('Link {}: {} frames dropped, {} sentences coalesced, queue depth up to {}'.format(
+                self.path, dropped, coalesced, queue.max_depth
+            ))
+
+        self._reported = (queue.dropped, queue.coalesced)
+        queue.max_depth = len(queue)
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+        if self.transport:
+            self.transport.close()
+            self.transport = None
@@ -0,0 +1,153 @@
+import pytest
+
+from uavsim.flightgear.client import TelnetClient, parse_command
+from uavsim.flightgear.fake import FakeFlightGear
+
+COMMANDS = {
+    1: '/controls/engines/engine[0]/throttle',
+    3: '/controls/flight/aileron',
+    4: '/controls/flight/elevator',
+}
+THROTTLE, AILERON, ELEVATOR = COMMANDS[1], COMMANDS[3], COMMANDS[4]
+
+
+def test_parse_single_command():
+    assert parse_command('3,0.25\r\n', COMMANDS) == [(AILERON, '0.25')]
+
+
+def test_parse_command_vector():
+    assert parse_command('1, 0.8, 3,-0.1,4,0.05', COMMANDS) == [
+        (THROTTLE, '0.8'), (AILERON, '-0.1'), (ELEVATOR, '0.05')
+    ]
+
+
+@pytest.mark.parametrize('line', ['', '3', '3,0.25,4', '3,0.25,4,0.1,1'])
+def test_parse_malformed_command(line):
+    with pytest.raises(ValueError):
+        parse_command(line, COMMANDS)
+
+
+def test_parse_unknown_command_id():
+    with pytest.raises(KeyError):
+        parse_command('3,0.25,99,1.0', COMMANDS)
+
+    with pytest.raises(ValueError):
+        parse_command('aileron,0.25', COMMANDS)
+
+
+async def connect(fake):
+    """
+    A TelnetClient connected to the fake FlightGear on a free local port, counting its requests in `requests`.
+    """
+    server = await fake.start_telnet('127.0.0.1', 0)
+    client = TelnetClient('127.0.0.1', server.sockets[0].getsockname()[1], commands=COMMANDS)
+    client.requests = []
+    request_many = client._request_many
+
+    async def counted(cmds):
+        client.requests.append(list(cmds))
+
+        return await request_many(cmds)
+
+    client._request_many = counted
+
+    return client
+
+
+async def flushed(client):
+    if client._flusher is not None:
+        await client._flusher
+
+
+@pytest.mark.asyncio
+async def test_commands_reach_flightgear():
+    fake = FakeFlightGear()
+    client = await connect(fake)
+
+    await client.send_command('1,0.8,3,-0.1')
+    await flushed(client)
+
+    assert fake.tree.get(THROTTLE) == 0.8
+    assert fake.tree.get(AILERON) == -0.1
+    assert client.last_cmds == {THROTTLE: '0.8', AILERON: '-0.1'}
+
+    client.close()
+    fake.stop()
+
+
+@pytest.mark.asyncio
+async def test_invalid_commands_are_ignored():
+    fake = FakeFlightGear()
+    client = await connect(fake)
+
+    for line in ('3', '3,0.1,4', '99,1.0', 'aileron,0.1'):
+        await client.send_command(line)
+
+    await flushed(client)
+
+    assert client.requests == []
+    assert fake.commands == 0
+
+    client.close()
+    fake.stop()
+
+
+@pytest.mark.asyncio
+async def test_values_equal_to_the_last_sent_are_dropped():
+    fake = FakeFlightGear()
+    client = await connect(fake)
+
+    await client.send_command('3,0.25,4,0.1')
+    await flushed(client)
+    await client.send_command('3,0.25')
+    await flushed(client)
+
+    assert len(client.requests) == 1
+
+    # only the changed property of a vector is sent again
+    await client.send_command('3,0.25,4,0.2')
+    await flushed(client)
+
+    assert client.requests[1] == ['set {} 0.2\r\n'.format(ELEVATOR)]
+    assert fake.tree.get(ELEVATOR) == 0.2
+
+    client.close()
+    fake.stop()
+
+
+@pytest.mark.asyncio
+async def test_pending_sets_are_coalesced_into_one_write():
+    fake = FakeFlightGear()
+    client = await connect(fake)
+
+    await client.send_command('3,0.1')
+    await client.send_command('4,0.2,3,0.3')
+    await client.send_command('1,0.5')
+    await flushed(client)
+
+    # one write, a property keeping only its latest value
+    assert client.requests == [
+        ['set {} 0.3\r\n'.format(AILERON), 'set {} 0.2\r\n'.format(ELEVATOR), 'set {} 0.5\r\n'.format(THROTTLE)]
+    ]
+    assert fake.commands == 3
+    assert fake.tree.get(AILERON) == 0.3
+
+    client.close()
+    fake.stop()
+
+
+@pytest.mark.asyncio
+async def test_change_undone_before_the_flush_is_not_sent():
+    fake = FakeFlightGear()
+    client = await connect(fake)
+
+    await client.send_command('3,0.1')
+    await flushed(client)
+    await client.send_command('3,0.4')
+    await client.send_command('3,0.1')
+    await flushed(client)
+
+    assert len(client.requests) == 1
+
+    client.close()
+    fake.stop()
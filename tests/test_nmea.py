@@ -0,0 +1,98 @@
+import functools
+import operator
+import time
+
+import pytest
+
+from uavsim import nmea
+from uavsim.nmea import NMEA_SENTENCES, NMEAEncoder, nmea_checksum
+
+# 2018-10-18 10:00:00 UTC
+DT = 1539856800.0
+TELEMETRY = {
+    'dt': DT,
+    'latitude-deg': 56.95,
+    'longitude-deg': -24.1,
+    'altitude-ft': 1000.0,
+    'heading-deg': 274.07,
+    'groundspeed-kt': 95.5,
+    'roll-deg': 1.5,
+    'pitch-deg': -2.25,
+}
+
+
+def xor(payload):
+    return functools.reduce(operator.xor, payload, 0)
+
+
+@pytest.mark.parametrize('payload, checksum', [
+    (b'GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,', 0x47),
+    (b'GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W', 0x6A),
+    (b'GPVTG,054.7,T,034.4,M,005.5,N,010.2,K', 0x48),
+    (b'GPHDT,274.07,T', 0x03),
+])
+def test_checksum_known_answers(payload, checksum):
+    assert nmea_checksum(payload) == checksum
+
+
+def test_checksum_of_every_length():
+    payload = bytes(range(1, 100))
+
+    for size in range(len(payload)):
+        assert nmea_checksum(payload[:size]) == xor(payload[:size])
+
+
+def test_encoded_sentences():
+    data = NMEAEncoder().encode(TELEMETRY)
+    sentences = data.splitlines()
+
+    names = [sentence[1:].split(b',')[0] for sentence in sentences]
+
+    assert names == [b'EXINJ', b'GPGGA', b'GPRMC', b'GPVTG', b'GPHDT']
+    assert sentences[1].startswith(b'$GPGGA,100000.000,5695.0000,N,02410.0000,W,')
+    assert b',181018,' in sentences[2]
+    assert sentences[4] == b'$GPHDT,274.07,T*03'
+
+    for sentence in sentences[1:]:
+        payload, _, checksum = sentence[1:].partition(b'*')
+        assert int(checksum, 16) == xor(payload)
+
+
+def test_sizes_and_offsets():
+    encoder = NMEAEncoder()
+    data = encoder.encode(TELEMETRY, ('GGA', 'HDT'))
+
+    assert list(encoder.offsets) == ['GGA', 'HDT']
+    assert encoder.offsets['HDT'] == (encoder.sizes['GGA'], len(data))
+    assert data[slice(*encoder.offsets['HDT'])] == b'$GPHDT,274.07,T*03\n'
+
+
+def test_select():
+    encoder = NMEAEncoder()
+    data = encoder.encode(TELEMETRY)
+    lines = data.splitlines(keepends=True)
+
+    # a link that wants every sentence gets the shared buffer itself
+    assert encoder.select(data, NMEA_SENTENCES) is data
+    assert encoder.select(data, ('GGA', 'HDT')) == lines[1] + lines[4]
+    assert encoder.select(data, ('EXINJ',)) == lines[0]
+
+
+def test_clock_is_formatted_once_per_second(monkeypatch):
+    calls = []
+    gmtime = time.gmtime
+
+    def counting_gmtime(seconds):
+        calls.append(seconds)
+        return gmtime(seconds)
+
+    monkeypatch.setattr(nmea.time, 'gmtime', counting_gmtime)
+    encoder = NMEAEncoder()
+
+    first = encoder.encode(dict(TELEMETRY, dt=DT + 0.1), ('GGA',))
+    second = encoder.encode(dict(TELEMETRY, dt=DT + 0.9), ('GGA',))
+    third = encoder.encode(dict(TELEMETRY, dt=DT + 1.0), ('GGA',))
+
+    assert calls == [int(DT), int(DT) + 1]
+    assert first == second
+    assert third.startswith(b'$GPGGA,100001.000,')
@@ -0,0 +1,106 @@
+from uavsim.flightgear.parser import FG_PROP_REGEXP, FG_PROPERTY_CASTS, PropertyParser
+
+POSITION = (
+    b"latitude-deg =\t'56.92361111'\t(double)\r\n"
+    b"longitude-deg =\t'23.97111111'\t(double)\r\n"
+    b"altitude-ft =\t'2104.718352'\t(double)\r\n"
+    b"latitude-string =\t'56*55.417N'\t(string)\r\n"
+    b"/> "
+)
+ORIENTATION = (
+    b"heading-deg =\t'267.7012551'\t(double)\r\n"
+    b"yaw-deg =\t''\t(none)\r\n"
+    b"/> "
+)
+VELOCITIES = (
+    b"airspeed-kt =\t'301.5427761'\t(double)\r\n"
+    b"on-ground =\t'false'\t(bool)\r\n"
+    b"/> "
+)
+
+
+def regex_values(schema, responses):
+    """
+    The values of the responses as the line by line regular expression reads them.
+    """
+    values = [None] * len(schema)
+
+    for response in responses:
+        for line in response.decode('ascii').split('\r\n')[:-1]:
+            match = FG_PROP_REGEXP.match(line)
+
+            if match and match.group(2) and match.group(1) in schema.index:
+                cast = FG_PROPERTY_CASTS.get(match.group(3), str)
+                value = match.group(2).encode('ascii') if cast is not str else match.group(2)
+                values[schema.index[match.group(1)]] = cast(value)
+
+    return values
+
+
+def parsed(parser, responses):
+    values = parser.parse(responses)
+
+    assert values == regex_values(parser.schema, responses)
+
+    return dict(zip(parser.schema.names, values))
+
+
+def test_schema_of_the_first_sample():
+    parser = PropertyParser()
+    values = parsed(parser, (POSITION, ORIENTATION, VELOCITIES))
+
+    assert parser.schema.names == ('dt', 'latitude-deg', 'longitude-deg', 'altitude-ft', 'latitude-string',
+                                   'heading-deg', 'yaw-deg', 'airspeed-kt', 'on-ground')
+    assert values['dt'] is None
+    assert values['yaw-deg'] is None
+    assert values['latitude-string'] == '56*55.417N'
+    assert values['on-ground'] is False
+
+
+def test_same_layout_new_values():
+    parser = PropertyParser()
+    parsed(parser, (POSITION, ORIENTATION, VELOCITIES))
+    values = parsed(parser, (POSITION.replace(b'2104.718352', b'2110.5'), ORIENTATION, VELOCITIES))
+
+    assert values['altitude-ft'] == 2110.5
+
+
+def test_missing_value():
+    parser = PropertyParser()
+    parsed(parser, (POSITION, ORIENTATION, VELOCITIES))
+    values = parsed(parser, (POSITION.replace(b"altitude-ft =\t'2104.718352'\t(double)\r\n", b''), ORIENTATION,
+                             VELOCITIES))
+
+    assert values['altitude-ft'] is None
+    assert values['latitude-string'] == '56*55.417N'
+    assert values['airspeed-kt'] == 301.5427761
+
+
+def test_added_value():
+    parser = PropertyParser()
+    parsed(parser, (POSITION, ORIENTATION, VELOCITIES))
+    added = b"alpha-deg =\t'3.110029'\t(double)\r\n" + ORIENTATION
+    values = parsed(parser, (POSITION, added.replace(b'267.7012551', b'268.5'), VELOCITIES))
+
+    # a property the schema doesn't have is skipped, the ones after it keep their place
+    assert 'alpha-deg' not in values
+    assert values['heading-deg'] == 268.5
+    assert values['airspeed-kt'] == 301.5427761
+
+
+def test_quoted_value():
+    parser = PropertyParser()
+    parsed(parser, (POSITION, ORIENTATION, VELOCITIES))
+    quoted = POSITION.replace(b"'56*55.417N'", b"'56*55'417N'")
+    values = parsed(parser, (quoted, ORIENTATION, VELOCITIES))
+
+    # the regular expression can't read the value, the quote must not shift the values after it
+    assert values['latitude-string'] is None
+    assert values['heading-deg'] == 267.7012551
+    assert values['on-ground'] is False
+
+    # and back to the cached layout
+    values = parsed(parser, (POSITION, ORIENTATION, VELOCITIES.replace(b"'false'", b"'true'")))
+
+    assert values['latitude-string'] == '56*55.417N'
+    assert values['on-ground'] is True
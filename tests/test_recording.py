@@ -0,0 +1,164 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from uavsim.decimation import envelope
+from uavsim.recording import (
+    RECORDING_GROUP, RECORDING_LOD, RECORDING_VALUES, RecordingSession, TelemetryWriter, read_index,
+    recording_columns, recording_length, recording_lod
+)
+from uavsim.telemetry import TelemetryCodec, TelemetrySchema
+
+SCHEMA = TelemetrySchema((('dt', float), ('altitude-ft', float)))
+LOD_SCHEMA = TelemetrySchema((('dt', float), ('altitude-ft', float), ('gear', int), ('callsign', str)))
+
+
+def partition_paths(session):
+    return [os.path.join(session.directory, partition['file']) for partition in read_index(session.index_path)]
+
+
+def read_session(session):
+    rows = []
+
+    for path in partition_paths(session):
+        with h5py.File(path, 'r') as f:
+            group = f[RECORDING_GROUP]
+            values = group[RECORDING_VALUES][:recording_length(group)]
+            rows.extend([float(dt), float(altitude)] for dt, altitude in values)
+
+    return rows
+
+
+@pytest.fixture
+def session(tmpdir):
+    session = RecordingSession(str(tmpdir), rollover_interval=10)
+
+    yield session
+
+    session.close()
+
+
+def test_rollover_keeps_every_record(session):
+    rows = [[float(dt), 1000.0 + dt] for dt in range(35)]
+
+    for row in rows:
+        session.append_record(SCHEMA.record(row))
+
+    session.close()
+    partitions = read_index(session.index_path)
+
+    assert [(p['start'], p['end'], p['rows']) for p in partitions] == [
+        (0.0, 9.0, 10), (10.0, 19.0, 10), (20.0, 29.0, 10), (30.0, 34.0, 5)
+    ]
+    assert all(os.path.exists(path) for path in partition_paths(session))
+    assert read_session(session) == rows
+
+
+def test_rollover_keeps_every_frame(session):
+    codec = TelemetryCodec(SCHEMA)
+    rows = [[float(dt), 1000.0 + dt] for dt in range(30)]
+
+    for start in range(0, len(rows), 6):
+        session.append_frame(codec.decode_frame(codec.encode_frame(rows[start:start + 6])))
+
+    session.close()
+
+    # frames are never split, a partition rolls over between two of them
+    assert [p['rows'] for p in read_index(session.index_path)] == [12, 12, 6]
+    assert read_session(session) == rows
+
+
+def test_session_resumes_its_index(tmpdir):
+    session = RecordingSession(str(tmpdir), rollover_interval=10)
+    session.append_record(SCHEMA.record([0.0, 1000.0]))
+    session.close()
+
+    session = RecordingSession(str(tmpdir), rollover_interval=10)
+    session.append_record(SCHEMA.record([1.0, 1001.0]))
+    session.close()
+
+    assert len(read_index(session.index_path)) == 2
+    assert read_session(session) == [[0.0, 1000.0], [1.0, 1001.0]]
+
+
+def lod_rows(count, seed):
+    random = np.random.RandomState(seed)
+    altitude = random.normal(1000.0, 50.0, count)
+    # missing values are ignored by the envelopes
+    altitude[random.randint(0, count, count // 10)] = np.nan
+    gear = random.randint(0, 2, count)
+
+    return [[float(i), a, int(g), 'UAV'] for i, (a, g) in enumerate(zip(altitude, gear))]
+
+
+def write_unevenly(path, rows, flushes):
+    """
+    Appends the rows, flushing after each of the given row counts on top of the writer's own flushes every 7 rows.
+    """
+    writer = TelemetryWriter(path, flush_rows=7)
+    rows = iter(rows)
+
+    for count in flushes:
+        for row in [next(rows) for _ in range(count)]:
+            writer.append_record(LOD_SCHEMA.record(row))
+
+        writer.flush()
+
+    for row in rows:
+        writer.append_record(LOD_SCHEMA.record(row))
+
+    writer.close()
+
+
+def expected_level(columns, bucket):
+    """
+    Envelope of `bucket`-sample buckets over the raw columns, the trailing incomplete bucket included.
+    """
+    entries, consumed = envelope(columns, bucket)
+
+    if consumed < len(columns):
+        tail, _ = envelope(columns[consumed:], len(columns) - consumed)
+        entries = np.concatenate((entries, tail))
+
+    return entries
+
+
+def assert_pyramid_matches(path):
+    with h5py.File(path, 'r') as f:
+        group = f[RECORDING_GROUP]
+        lod = recording_lod(group)
+        columns = recording_columns(group[RECORDING_VALUES][:recording_length(group)], lod.items)
+
+        assert lod.items == ['dt', 'altitude-ft', 'gear']
+
+        for level, length in enumerate(lod.lengths(), 1):
+            expected = expected_level(columns, lod.factor ** level)
+
+            assert length == len(expected)
+            np.testing.assert_array_equal(lod.levels[level - 1][:length], expected)
+
+
+def test_pyramid_matches_the_recording(tmpdir):
+    path = str(tmpdir.join('recording.h5'))
+    rows = lod_rows(1500, 0)
+
+    write_unevenly(path, rows[:700], [3, 1, 20, 64, 5, 130])
+    assert_pyramid_matches(path)
+
+    # a reopened recording carries on with the incomplete buckets of every level
+    write_unevenly(path, rows[700:], [1, 63, 9, 511])
+    assert_pyramid_matches(path)
+
+
+def test_pyramid_is_rebuilt_for_a_recording_without_one(tmpdir):
+    path = str(tmpdir.join('recording.h5'))
+    rows = lod_rows(900, 1)
+    write_unevenly(path, rows[:600], [17, 250])
+
+    with h5py.File(path, 'a') as f:
+        del f[RECORDING_GROUP][RECORDING_LOD]
+
+    write_unevenly(path, rows[600:], [2, 45])
+    assert_pyramid_matches(path)
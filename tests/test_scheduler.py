@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from uavsim.scheduler import RateScheduler
+
+PERIOD = 0.02
+# longer than any of the runs, so the statistics aren't reset by a report
+REPORT_INTERVAL = 0.5
+
+
+def run_calls(delays, other=None):
+    """
+    Runs a PERIOD group whose nth call blocks for delays[n] seconds, until all of them were made. Returns the group
+    with the loop times of its calls.
+    """
+    scheduler = RateScheduler(report_interval=REPORT_INTERVAL)
+    calls = []
+
+    async def callback():
+        calls.append(loop.time())
+        time.sleep(delays[len(calls) - 1])
+
+        if len(calls) == len(delays):
+            scheduler.stop()
+
+    loop = asyncio.new_event_loop()
+    group = scheduler.add('test', 1 / PERIOD, callback)
+
+    if other is not None:
+        scheduler.add('other', 1 / PERIOD, other)
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(scheduler.run(), 5))
+    finally:
+        loop.close()
+
+    return group, calls
+
+
+def test_deadlines_do_not_drift():
+    group, calls = run_calls([PERIOD / 2] * 10)
+
+    assert group.missed == 0
+    # every call is made against start + n * period, the callback durations don't add up
+    assert calls[-1] - calls[0] == pytest.approx(9 * PERIOD, abs=PERIOD / 2)
+
+
+def test_late_call_runs_at_once():
+    # overruns its period by half of one, the next call is late but none is skipped
+    group, calls = run_calls([1.5 * PERIOD, 0, 0, 0])
+
+    assert group.missed == 0
+    assert calls[1] - calls[0] == pytest.approx(1.5 * PERIOD, abs=PERIOD / 4)
+    assert calls[2] - calls[0] == pytest.approx(2 * PERIOD, abs=PERIOD / 4)
+
+
+def test_overrun_skips_whole_periods_only():
+    # overruns by two and a half periods, the two deadlines that passed entirely are skipped
+    group, calls = run_calls([3.5 * PERIOD, 0, 0])
+
+    assert group.missed == 2
+    assert calls[1] - calls[0] == pytest.approx(3.5 * PERIOD, abs=PERIOD / 4)
+    assert calls[2] - calls[0] == pytest.approx(4 * PERIOD, abs=PERIOD / 4)
+
+
+def test_late_group_does_not_starve_the_others():
+    other_calls = []
+
+    async def other():
+        other_calls.append(True)
+
+    run_calls([1.5 * PERIOD] * 6, other)
+
+    assert other_calls
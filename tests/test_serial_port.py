@@ -0,0 +1,103 @@
+import os
+import pty
+import select
+import tty
+
+import pytest
+
+from uavsim.serial_port import SerialPort
+
+
+def open_pair(**options):
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+
+    return SerialPort(os.ttyname(slave), **options), master, slave
+
+
+@pytest.fixture
+def serial_pair():
+    """
+    A SerialPort on a pty, with the master end standing in for the UAV.
+    """
+    port, master, slave = open_pair()
+
+    yield port, master
+
+    port.close()
+    os.close(slave)
+
+    try:
+        os.close(master)
+    except OSError:
+        # closed by the test
+        pass
+
+
+def read_lines(port):
+    """
+    Lines of everything the port received, read until it has been idle for a moment.
+    """
+    lines = []
+
+    while select.select([port.fd], [], [], 0.1)[0]:
+        if not port.read_available():
+            break
+
+        lines.extend(bytes(line) for line in port.lines())
+
+    return lines
+
+
+def test_lines_across_reads(serial_pair):
+    port, master = serial_pair
+
+    os.write(master, b'1,0.5')
+    assert read_lines(port) == []
+
+    os.write(master, b'00\r\n2,')
+    assert read_lines(port) == [b'1,0.500']
+
+    os.write(master, b'0.25\n\n3,1\r\n')
+    assert read_lines(port) == [b'2,0.25', b'', b'3,1']
+    assert port.frames_read == 4
+
+
+def test_overflowed_line_is_dropped_up_to_its_line_ending():
+    port, master, slave = open_pair(read_buffer=16)
+
+    try:
+        os.write(master, b'0123456789' * 3 + b'\r\nok\r\n')
+
+        assert read_lines(port) == [b'ok']
+        assert port.dropped_frames == 1
+    finally:
+        port.close()
+        os.close(slave)
+        os.close(master)
+
+
+def test_idle_port(serial_pair):
+    port, master = serial_pair
+
+    assert port.read_available() == 0
+    assert port.read_byte() is None
+    assert not port.hung_up()
+
+    os.write(master, b'ab')
+    select.select([port.fd], [], [], 1.0)
+
+    assert port.read_byte() == ord('a')
+    assert port.read_byte() == ord('b')
+    assert port.read_byte() is None
+
+
+def test_hung_up_port(serial_pair):
+    port, master = serial_pair
+    os.close(master)
+
+    assert port.hung_up()
+
+    with pytest.raises(EOFError):
+        port.read_available()
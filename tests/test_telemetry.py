@@ -0,0 +1,50 @@
+from uavsim.telemetry import TelemetryCodec, TelemetryDecoder, TelemetrySchema
+
+SCHEMA = TelemetrySchema((('dt', float), ('altitude-ft', float), ('gear', int), ('on-ground', bool), ('name', str)))
+ROWS = [
+    [1.0, 1500.5, 1, False, 'c172p'],
+    [1.25, None, 0, True, 'c172p'],
+    [None, 1502.0, None, None, ''],
+]
+
+
+def test_payload_round_trip():
+    codec = TelemetryCodec(SCHEMA)
+
+    for row in ROWS:
+        record = codec.decode(codec.encode(row))
+
+        assert record.schema is SCHEMA
+        assert record.values == row
+
+
+def test_frame_round_trip():
+    codec = TelemetryCodec(SCHEMA)
+    frame = codec.decode_frame(codec.encode_frame(ROWS))
+
+    assert len(frame) == len(ROWS)
+    assert [record.values for record in frame.records()] == ROWS
+
+
+def test_decoder_uses_the_announced_schema():
+    codec = TelemetryCodec(SCHEMA)
+    decoder = TelemetryDecoder()
+    payload = codec.encode(ROWS[1])
+
+    assert decoder.decode(payload) is None
+
+    decoder.on_schema(codec.description)
+
+    assert decoder.decode(payload).to_dict() == {'dt': 1.25, 'gear': 0, 'on-ground': True, 'name': 'c172p'}
+    assert decoder.decode({'dt': 2.0}) == {'dt': 2.0}
+
+
+def test_decoder_frames():
+    codec = TelemetryCodec(SCHEMA)
+    decoder = TelemetryDecoder()
+
+    json_frame = decoder.decode_frame(codec.encode_frame_json(ROWS))
+    binary_frame = decoder.decode_frame(codec.encode_frame(ROWS))
+
+    assert [record.values for record in json_frame.records()] == ROWS
+    assert [record.values for record in binary_frame.records()] == ROWS
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from uavsim.uav_link import POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST, OutboundQueue
+
+
+@pytest.mark.asyncio
+async def test_block_drops_the_new_frame_when_full():
+    queue = OutboundQueue(2, POLICY_BLOCK)
+
+    assert queue.put_nowait(b'1')
+    assert queue.put_nowait(b'2')
+    assert queue.full
+    assert not queue.put_nowait(b'3')
+    assert queue.dropped == 1
+
+    data, _ = await queue.get()
+
+    assert data == b'12'
+
+
+@pytest.mark.asyncio
+async def test_block_wakes_up_once_the_writer_took_the_frames():
+    queue = OutboundQueue(1, POLICY_BLOCK)
+    queue.put_nowait(b'1')
+    ready = asyncio.ensure_future(queue.ready())
+
+    await asyncio.sleep(0)
+    assert not ready.done()
+
+    await queue.get()
+    await asyncio.wait_for(ready, 1)
+
+    assert queue.put_nowait(b'2')
+    assert queue.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest():
+    queue = OutboundQueue(2, POLICY_DROP_OLDEST)
+
+    for frame in (b'1', b'2', b'3'):
+        assert queue.put_nowait(frame, 'GGA')
+
+    data, _ = await queue.get()
+
+    assert data == b'23'
+    assert queue.dropped == 1
+    assert not queue.full
+
+
+@pytest.mark.asyncio
+async def test_latest_replaces_a_sentence_in_place():
+    queue = OutboundQueue(4, POLICY_LATEST)
+    first, second = (1.0, None), (2.0, None)
+
+    queue.put_nowait(b'GGA1', 'GGA', first)
+    queue.put_nowait(b'RMC1', 'RMC', first)
+    queue.put_nowait(b'GGA2', 'GGA', second)
+
+    data, stamps = await queue.get()
+
+    assert data == b'GGA2RMC1'
+    assert stamps == [second, first]
+    assert queue.coalesced == 1
+    assert queue.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_latest_drops_the_oldest_sentence_when_full():
+    queue = OutboundQueue(2, POLICY_LATEST)
+
+    for key in ('GGA', 'RMC', 'VTG'):
+        queue.put_nowait(key.encode('ascii'), key)
+
+    data, _ = await queue.get()
+
+    assert data == b'RMCVTG'
+    assert queue.dropped == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        OutboundQueue(2, 'newest')